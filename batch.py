@@ -0,0 +1,418 @@
+# Headless batch solver: reads puzzles from files or stdin and writes one JSON
+# result per line
+#
+# Puzzle format: one puzzle per line, rows separated by '/', cells written as
+# '0', '1' and '_' (or '.') for an empty cell, e.g. "1__0/____/_0__/___1".
+# Blank lines and lines starting with '#' are skipped. Files ending in ".bpz" are
+# read as packed corpora, see corpus.py.
+import argparse
+import contextlib
+import glob
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+
+from bitboard import BitBoard, EMPTY, popcount
+from corpus import Corpus
+from line_table import get_line_table
+from line_cache import LineCache, DEFAULT_SIZE
+from portfolio import Portfolio, STRATEGIES, DEFAULT_STRATEGIES, DEFAULT_TIMEOUT
+from probing import Prober, DEFAULT_BUDGET
+from sat_backend import DEFAULT_BACKEND
+from solution_cache import SolutionCache, DEFAULT_SOLUTIONS
+from solver import Solver
+from smt_solver import SMT_Solver
+from search_solver import SearchSolver
+from stats import SolverStats
+
+
+def parse_puzzle(text):
+    """
+    Method parses one puzzle line into a BitBoard
+
+    :return the board, or None if the line is not a rectangular puzzle with an
+            even number of rows and columns
+    """
+    rows = [row.strip() for row in text.strip().split('/')]
+    grid = [[EMPTY if cell in '_.' else cell for cell in row] for row in rows]
+    if not grid or not grid[0] or len(grid) % 2 or len(grid[0]) % 2:
+        return None
+    for row in grid:
+        if len(row) != len(grid[0]) or any(cell not in ('0', '1', EMPTY) for cell in row):
+            return None
+    return BitBoard.from_grid(grid)
+
+
+def format_board(board):
+    """
+    Method
+    :return the board in the puzzle format read by parse_puzzle
+    """
+    return '/'.join(''.join(row) for row in board.board)
+
+
+def solve_board(board, search=False, line_engine="table", stats=None, cache=None,
+                probe_budget=DEFAULT_BUDGET, backend=DEFAULT_BACKEND):
+    """
+    Method runs the heuristic rules, then probing, then the line solver, then
+    optionally the search, stopping at the first stage that settles the puzzle
+
+    :return dict with the status, the stage that settled it and whether the
+            search found more than one solution
+
+    :param stats is an optional SolverStats shared by all stages
+    :param cache is an optional LineCache shared by all stages
+    :param probe_budget is the number of probes probing may make, 0 skips it
+    :param backend is the solver backend of the SAT line engines, see sat_backend.py
+    """
+    result = {"status": "unsolved", "stage": None, "multiple_solutions": False}
+
+    # the solvers report progress on stdout, which carries the results here
+    with contextlib.redirect_stdout(io.StringIO()):
+        solver = Solver(board, stats, cache)
+        board.add_callback(solver.update_callback)
+        solver.solve()
+        if solver.contradiction:
+            result.update(status="unsatisfiable", stage="heuristics")
+            return result
+        if board.is_board_solved():
+            result.update(status="solved", stage="heuristics")
+            return result
+
+        if probe_budget:
+            prober = Prober(board, probe_budget, stats, cache)
+            board.add_callback(prober.update_callback)
+            prober.solve()
+            if prober.contradiction:
+                result.update(status="unsatisfiable", stage="probing")
+                return result
+            if board.is_board_solved():
+                result.update(status="solved", stage="probing")
+                return result
+
+        smt_solver = SMT_Solver(board, line_engine, stats=stats, cache=cache, backend=backend)
+        board.add_callback(smt_solver.update_callback)
+        outcome = smt_solver.solve()
+        # the line solver fills lines one by one and may repeat one
+        if outcome == "not satisfiable!" or board.has_duplicate_lines():
+            result.update(status="unsatisfiable", stage="smt")
+            return result
+        if board.is_board_solved():
+            result.update(status="solved", stage="smt")
+            return result
+
+        # a stalled line solver proves nothing, only the search tells a second
+        # solution apart from a deduction the rules miss
+        if search:
+            outcome = SearchSolver(board, stats=stats, cache=cache).solve()
+            if outcome == "":
+                result.update(status="solved", stage="search")
+            elif outcome == "not satisfiable!":
+                result.update(status="unsatisfiable", stage="search")
+            else:
+                result.update(stage="search", multiple_solutions=True)
+    return result
+
+
+def solve_puzzle(job):
+    """
+    Method solves one (index, puzzle, search, with_stats, probe_budget) job in a
+    worker process, the puzzle is either a line of text or the (rows, cols, known,
+    ones) masks of a corpus entry
+
+    :return the JSON result as a dict
+    """
+    index, puzzle, search, with_stats, probe_budget = job
+    start = time.perf_counter()
+    board = read_board(puzzle)
+    if board is None:
+        return invalid_result(index)
+
+    stats = SolverStats() if with_stats else None
+    result, key, transform = None, None, None
+    if _solutions is not None:
+        result, key, transform = _solutions.lookup_board(board)
+    if result is None:
+        result = solve_board(board, search, stats=stats, cache=_cache,
+                             probe_budget=probe_budget)
+        if _solutions is not None and definitive(result, search):
+            _solutions.store(key, transform, result, board)
+    else:
+        result["cached"] = True
+    if stats is not None:
+        result["stats"] = stats.to_dict()
+    result["index"] = index
+    result["solution"] = format_board(board)
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+def definitive(result, search):
+    """
+    Method
+    :return True if the result does not depend on the options it was solved
+            with, only those are kept by a SolutionCache
+    """
+    # an unsolved puzzle may only need the search, which always settles it
+    return result["status"] != "unsolved" or search
+
+
+def read_board(puzzle):
+    """
+    Method
+    :return the board of a line of text or of (rows, cols, known, ones) masks, None
+            if the line is not a puzzle
+    """
+    if isinstance(puzzle, tuple):
+        return BitBoard.from_masks(*puzzle)
+    return parse_puzzle(puzzle)
+
+
+def invalid_result(index):
+    return {"index": index, "status": "invalid", "stage": None, "solution": None,
+            "multiple_solutions": False, "time": 0.0}
+
+
+def race_puzzle(index, puzzle, portfolio, solutions=None):
+    """
+    Method solves one puzzle, given as in solve_puzzle, by racing the strategies of
+    portfolio, each in its own process, unless the optional SolutionCache knows it
+
+    :return the JSON result as a dict, the status is "timeout" if no strategy
+            answered in time
+    """
+    start = time.perf_counter()
+    board = read_board(puzzle)
+    if board is None:
+        return invalid_result(index)
+    result, key, transform = None, None, None
+    if solutions is not None:
+        result, key, transform = solutions.lookup_board(board)
+    if result is None:
+        result = portfolio.solve(board)
+        # a race only ends without an answer on a timeout
+        if solutions is not None and result["status"] != "timeout" and (
+                result["status"] != "unsolved" or result["multiple_solutions"]):
+            solutions.store(key, transform, result, board)
+    else:
+        result["cached"] = True
+    result["index"] = index
+    result["solution"] = format_board(board)
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+# line cache and solution cache of the worker process, set up by warm_worker
+_cache = None
+_solutions = None
+
+
+def _open_cache(cache_class, size, path):
+    cache = cache_class(size)
+    if path:
+        cache.load(path)
+        # every worker leaves its cache next to the file when it exits, main
+        # merges them once the pool is done
+        multiprocessing.util.Finalize(None, cache.save, args=(
+            "{}.{}".format(path, os.getpid()),), exitpriority=10)
+    return cache
+
+
+def warm_worker(dimensions, cache_size=0, cache_file=None, solutions_size=0,
+                solutions_file=None):
+    # build the line tables once per worker instead of on the first puzzle
+    for dimension in dimensions:
+        get_line_table(dimension)
+
+    global _cache, _solutions
+    if cache_size:
+        _cache = _open_cache(LineCache, cache_size, cache_file)
+    if solutions_size:
+        _solutions = _open_cache(SolutionCache, solutions_size, solutions_file)
+
+
+def merge_caches(cache_file, cache_size, cache_class=LineCache):
+    """
+    Method merges the caches left by the workers into cache_file
+    """
+    cache = cache_class(cache_size)
+    cache.load(cache_file)
+    shards = [path for path in glob.glob(glob.escape(cache_file) + ".*")
+              if path.rsplit('.', 1)[1].isdigit()]
+    for path in shards:
+        cache.load(path)
+        os.remove(path)
+    cache.save(cache_file)
+
+
+def prefilter(chunk, with_stats=False):
+    """
+    Method runs the heuristic rules vectorized with NumPy (see vector_solver.py) on a
+    chunk of (index, puzzle) pairs, puzzles given as in solve_puzzle
+
+    :return (results, remaining): the results of the puzzles the rules settled, and
+            the (index, puzzle) pairs left for solve_puzzle, carrying the cells the
+            rules found as (rows, cols, known, ones)
+    """
+    from vector_solver import VectorSolver, boards_to_array, array_to_masks
+
+    groups = {}
+    remaining = []
+    for index, puzzle in chunk:
+        board = read_board(puzzle)
+        if board is None:
+            # solve_puzzle reports it as invalid
+            remaining.append((index, puzzle))
+        else:
+            groups.setdefault((board.rows, board.cols), []).append((index, board))
+
+    results = []
+    for (rows, cols), group in groups.items():
+        start = time.perf_counter()
+        solver = VectorSolver(boards_to_array(board for _, board in group))
+        solver.propagate()
+        solved = solver.solved()
+        share = (time.perf_counter() - start) / len(group)
+
+        for k, (index, board) in enumerate(group):
+            known, ones = array_to_masks(solver.boards[k])
+            if not (solved[k] or solver.contradiction[k]):
+                remaining.append((index, (rows, cols, known, ones)))
+                continue
+            result = {"status": "solved" if solved[k] else "unsatisfiable",
+                      "stage": "heuristics", "multiple_solutions": False}
+            if with_stats:
+                stats = SolverStats()
+                stats.record("vector_rules", popcount(known) - popcount(board.to_masks()[0]),
+                             share)
+                result["stats"] = stats.to_dict()
+            result["index"] = index
+            result["solution"] = format_board(BitBoard.from_masks(rows, cols, known, ones))
+            result["time"] = share
+            results.append(result)
+    return results, remaining
+
+
+def read_puzzles(paths):
+    """
+    Method yields the puzzles of the given files, '-' or no file is stdin
+    """
+    for path in paths or ['-']:
+        if path.endswith(".bpz"):
+            with Corpus(path) as corpus:
+                for index in range(len(corpus)):
+                    known, ones = corpus.masks(index)
+                    yield (corpus.rows, corpus.cols, known, ones)
+            continue
+
+        stream = sys.stdin if path == '-' else open(path)
+        try:
+            for line in stream:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solve binary puzzles headlessly and print one JSON result per line")
+    parser.add_argument("files", nargs="*", help="puzzle files, '-' or nothing for stdin")
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="puzzles handed to a worker at a time")
+    parser.add_argument("--search", action="store_true",
+                        help="settle puzzles the line solver leaves open with a complete search")
+    parser.add_argument("--stats", action="store_true",
+                        help="add per-rule solver statistics to every result")
+    parser.add_argument("--probe-budget", type=int, default=DEFAULT_BUDGET,
+                        help="probes per puzzle before the line solver takes over "
+                             "(0 skips probing)")
+    parser.add_argument("--warm", type=int, nargs="*", default=[6, 8, 10, 12, 14],
+                        help="line lengths whose tables each worker builds at start")
+    parser.add_argument("--line-cache", type=int, default=DEFAULT_SIZE,
+                        help="lines whose deductions each worker keeps (0 disables)")
+    parser.add_argument("--cache-file",
+                        help="load the line cache from this file and save it back at the end")
+    parser.add_argument("--solution-cache", type=int, default=DEFAULT_SOLUTIONS,
+                        help="solved puzzles each worker keeps, shared by their mirrored, "
+                             "rotated and 0/1 swapped copies (0 disables)")
+    parser.add_argument("--solution-file",
+                        help="load the solution cache from this file and save it back at "
+                             "the end")
+    parser.add_argument("--prefilter", type=int, default=0, metavar="N",
+                        help="run the heuristic rules with NumPy on chunks of N puzzles "
+                             "before the workers see them")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="race several strategies on every puzzle, each in its own "
+                             "process, and keep the first definitive answer")
+    parser.add_argument("--strategies", nargs="+", default=DEFAULT_STRATEGIES,
+                        choices=sorted(STRATEGIES), help="strategies raced by --portfolio")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds a --portfolio race may take")
+    args = parser.parse_args(argv)
+
+    if args.prefilter and importlib.util.find_spec("numpy") is None:
+        parser.error("--prefilter needs numpy")
+
+    puzzles = enumerate(read_puzzles(args.files))
+    if args.prefilter:
+        chunks = iter(lambda: list(itertools.islice(puzzles, args.prefilter)), [])
+    else:
+        chunks = [puzzles]
+
+    def write_results(solve_chunk):
+        for chunk in chunks:
+            settled = []
+            if args.prefilter:
+                settled, chunk = prefilter(chunk, args.stats)
+            results = solve_chunk(chunk)
+            if settled:
+                # results of a chunk are written in the order of the puzzles
+                results = sorted(itertools.chain(settled, results),
+                                 key=lambda result: result["index"])
+            for result in results:
+                sys.stdout.write(json.dumps(result) + "\n")
+                sys.stdout.flush()
+
+    if args.portfolio:
+        # one puzzle at a time, the race runs a process per strategy
+        portfolio = Portfolio(args.strategies, args.timeout)
+        solutions = None
+        if args.solution_cache:
+            solutions = SolutionCache(args.solution_cache)
+            if args.solution_file:
+                solutions.load(args.solution_file)
+        write_results(lambda chunk: (race_puzzle(index, puzzle, portfolio, solutions)
+                                     for index, puzzle in chunk))
+        if solutions is not None and args.solution_file:
+            solutions.save(args.solution_file)
+        return
+
+    cache_file = args.cache_file if args.line_cache else None
+    solutions_file = args.solution_file if args.solution_cache else None
+    with multiprocessing.Pool(args.processes, warm_worker,
+                              (args.warm, args.line_cache, cache_file, args.solution_cache,
+                               solutions_file)) as pool:
+        write_results(lambda chunk: pool.imap(
+            solve_puzzle, ((index, puzzle, args.search, args.stats, args.probe_budget)
+                           for index, puzzle in chunk), args.chunksize))
+        # let the workers exit on their own, so that they save their caches
+        pool.close()
+        pool.join()
+    if cache_file:
+        merge_caches(cache_file, args.line_cache)
+    if solutions_file:
+        merge_caches(solutions_file, args.solution_cache, SolutionCache)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# Reproducible benchmark of the solving pipeline over a seeded puzzle corpus
+#
+# Every (size, difficulty) group is built from the same seed on every run, timed
+# through batch.solve_board, and reported as throughput, p50/p99 latency, peak
+# traced memory and the share of puzzles settled by each stage. Results can be
+# saved as a baseline and compared against on later runs. With several --backends
+# every group is solved once per solver backend of the SAT line engines, which
+# the table engine does not use, with --portfolio every puzzle is raced by the
+# strategies of portfolio.py instead.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from bitboard import BitBoard
+from corpus import Corpus, write_corpus
+from generator import random_solution, PuzzleGenerator
+from batch import solve_board
+from probing import DEFAULT_BUDGET
+from sat_backend import BACKENDS, DEFAULT_BACKEND
+from line_cache import LineCache
+from portfolio import Portfolio, DEFAULT_TIMEOUT
+
+# fraction of the cells given in a puzzle of each difficulty
+DIFFICULTIES = {"easy": 0.5, "medium": 0.4, "hard": 0.3}
+LEVELS = ["easy", "medium", "hard"]
+SIZES = [6, 8, 10, 12, 14, 16]
+
+
+def make_puzzle(rows, cols, fraction, rng):
+    """
+    Method
+    :return a board keeping a random fraction of the cells of a random solution
+    """
+    solution = random_solution(rows, cols, rng)
+    puzzle = BitBoard(rows, cols)
+    for i in range(rows):
+        for j in range(cols):
+            if rng.random() < fraction:
+                puzzle.put(solution.get(i, j), i, j)
+    return puzzle
+
+
+def build_group(size, difficulty, count, seed, corpus_dir=None, graded=False):
+    """
+    Method builds (or loads from corpus_dir) the puzzles of one benchmark group,
+    the same seed always gives the same puzzles
+
+    :param graded uses uniquely solvable puzzles from the generator, graded by the
+           stage that solves them, instead of a share of given cells
+    :return list of boards
+    """
+    path = None
+    if corpus_dir is not None:
+        path = os.path.join(corpus_dir, "{}x{}-{}-{}-{}{}.bpz".format(
+            size, size, difficulty, count, seed, "-graded" if graded else ""))
+        if os.path.exists(path):
+            with Corpus(path) as corpus:
+                return list(corpus)
+
+    rng = random.Random("{}-{}-{}".format(seed, size, difficulty))
+    if graded:
+        generator = PuzzleGenerator(size, seed=rng.random())
+        puzzles = [puzzle for puzzle, _ in generator.generate_many(count, difficulty)]
+    else:
+        puzzles = [make_puzzle(size, size, DIFFICULTIES[difficulty], rng)
+                   for _ in range(count)]
+    if path is not None:
+        os.makedirs(corpus_dir, exist_ok=True)
+        write_corpus(path, puzzles)
+    return puzzles
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_group(puzzles, line_engine, search, cache=None, probe_budget=DEFAULT_BUDGET,
+              backend=DEFAULT_BACKEND, portfolio=None):
+    """
+    Method solves copies of the puzzles, first timed and then under tracemalloc,
+    sharing the optional LineCache
+
+    :param portfolio is an optional Portfolio that solves the puzzles instead of
+           the stages of batch.solve_board
+    :return dict of measurements for the group
+    """
+    def solve(board):
+        if portfolio is not None:
+            return portfolio.solve(board)
+        return solve_board(board, search, line_engine, cache=cache,
+                           probe_budget=probe_budget, backend=backend)
+
+    # build the line tables and warm the caches outside of the measurement
+    for puzzle in puzzles[:1]:
+        solve(puzzle.copy())
+
+    latencies = []
+    stages = {}
+    start = time.perf_counter()
+    for puzzle in puzzles:
+        board = puzzle.copy()
+        puzzle_start = time.perf_counter()
+        result = solve(board)
+        latencies.append(time.perf_counter() - puzzle_start)
+        stage = result["stage"] if result["status"] == "solved" else "unsolved"
+        stages[stage] = stages.get(stage, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    # memory is measured in a separate pass, tracing slows the solvers down
+    tracemalloc.start()
+    for puzzle in puzzles:
+        solve(puzzle.copy())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "puzzles": len(puzzles),
+        "throughput": len(puzzles) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "peak_memory": peak,
+        "stages": {stage: count / float(len(puzzles)) for stage, count in stages.items()},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Method prints the change of every group against the baseline
+
+    :return number of groups slower than the baseline by more than tolerance
+    """
+    regressions = 0
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            print("{:24} not in baseline".format(name))
+            continue
+        old = baseline[name]
+        ratio = old["p50"] and result["p50"] / old["p50"]
+        speedup = old["throughput"] and result["throughput"] / old["throughput"]
+        slower = ratio > 1 + tolerance
+        regressions += slower
+        print("{:24} throughput x{:.2f}  p50 x{:.2f}  p99 {:.2f}ms -> {:.2f}ms{}".format(
+            name, speedup, ratio, 1000 * old["p99"], 1000 * result["p99"],
+            "  SLOWER" if slower else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the binary puzzle solvers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--difficulties", nargs="+", default=LEVELS, choices=LEVELS)
+    parser.add_argument("--count", type=int, default=20, help="puzzles per group")
+    parser.add_argument("--seed", type=int, default=2020)
+    parser.add_argument("--line-engine", default="table",
+                        choices=["table", "incremental", "smt"])
+    parser.add_argument("--backends", nargs="+", default=[DEFAULT_BACKEND],
+                        choices=sorted(BACKENDS),
+                        help="solver backends of the incremental and smt line engines, "
+                             "each runs on the same puzzles")
+    parser.add_argument("--probe-budget", type=int, default=DEFAULT_BUDGET,
+                        help="probes per puzzle before the line solver (0 skips probing)")
+    parser.add_argument("--search", action="store_true",
+                        help="settle what the line solver leaves open with a search")
+    parser.add_argument("--graded", action="store_true",
+                        help="benchmark uniquely solvable puzzles graded by the generator")
+    parser.add_argument("--line-cache", type=int, default=0,
+                        help="share a cache of this many line deductions between puzzles")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="race the strategies of portfolio.py on every puzzle")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds a --portfolio race may take")
+    parser.add_argument("--corpus-dir", help="cache the generated corpus in this directory")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative p50 slowdown reported as a regression")
+    args = parser.parse_args(argv)
+    if len(args.backends) > 1 and args.line_engine == "table" and not args.portfolio:
+        # the table engine never calls a solver backend, every row would be the same
+        parser.error("--backends compares the SAT line engines, "
+                     "use --line-engine incremental or smt")
+
+    cache = LineCache(args.line_cache) if args.line_cache else None
+    portfolio = Portfolio(timeout=args.timeout) if args.portfolio else None
+    results = {}
+    print("{:24} {:>10} {:>9} {:>9} {:>10}  stages".format(
+        "group", "puzzles/s", "p50 ms", "p99 ms", "peak KiB"))
+    for size in args.sizes:
+        for difficulty in args.difficulties:
+            group = "{}x{}-{}".format(size, size, difficulty)
+            puzzles = build_group(size, difficulty, args.count, args.seed, args.corpus_dir,
+                                  args.graded)
+            for backend in args.backends:
+                # the backend is named once there is more than one to compare
+                name = group if len(args.backends) == 1 else "{}/{}".format(group, backend)
+                if portfolio is not None:
+                    portfolio.backend = backend
+                result = run_group(puzzles, args.line_engine, args.search, cache,
+                                   args.probe_budget, backend, portfolio)
+                results[name] = result
+                print("{:24} {:10.1f} {:9.3f} {:9.3f} {:10.1f}  {}".format(
+                    name, result["throughput"], 1000 * result["p50"], 1000 * result["p99"],
+                    result["peak_memory"] / 1024.0,
+                    " ".join("{}={:.0%}".format(stage, share)
+                             for stage, share in sorted(result["stages"].items()))))
+
+    if cache is not None:
+        print("line cache: {} lines, {:.0%} hits".format(len(cache), cache.hit_rate()))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,123 +1,183 @@
-# Main file for the binary solver
-import pygame
-
-from board import Board
-from solver import Solver
-from smt_solver import SMT_Solver
-from cube import EMPTY
-
-
-def main():
-    # information about the initial setup
-    dimension = 8
-    ones_list = {}
-    zeros_list = {}
-
-    # make initial board from 0s and 1s
-    board = Board(dimension, zeros_list, ones_list, 540, 540)
-    # print full initial board
-    print("Initial board:")
-    board.pretty_print()
-
-    # define solvers
-    solver = Solver(board)
-    board.add_callback(solver.update_callback)
-
-    # define solvers
-    smt_solver = SMT_Solver(board)
-    board.add_callback(smt_solver.update_callback)
-
-    # Make window
-    pygame.font.init()
-    win = pygame.display.set_mode((540, 600))
-    pygame.display.set_caption("Binary puzzle solver")
-    key = None
-    run = True
-
-    while run:
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_0:
-                    key = '0'
-                if event.key == pygame.K_1:
-                    key = '1'
-                if event.key == pygame.K_UP:
-                    key = None
-                    board.move_up()
-                if event.key == pygame.K_DOWN:
-                    key = None
-                    board.move_down()
-                if event.key == pygame.K_LEFT:
-                    key = None
-                    board.move_left()
-                if event.key == pygame.K_RIGHT:
-                    key = None
-                    board.move_right()
-                if event.key == pygame.K_F5:
-                    board.update_board()
-                    print("=====================================================")
-                    board.put_message("Solving puzzle ...")
-                    board.redraw_window(win)
-                    pygame.display.update()
-                    board.pretty_print()
-                    result = solver.solve()
-                    if result:
-                        board.update_view()
-                        board.put_message("Solved board!")
-                        board.pretty_print()
-                    else:
-                        board.update_view()
-                        board.put_message(
-                            "Not solvable via conventional methods, try F6")
-                if event.key == pygame.K_F6:
-                    board.update_board()
-                    print("=====================================================")
-                    board.put_message("Solving puzzle with SMT ...")
-                    board.redraw_window(win)
-                    pygame.display.update()
-                    board.pretty_print()
-                    result = smt_solver.solve()
-                    if result == "":
-                        board.update_view()
-                        board.put_message("Solved board with SMT!")
-                        board.pretty_print()
-                    else:
-                        board.update_view()
-                        board.put_message(
-                            "Puzzle cannot be solved because " + result)
-
-                if event.key == pygame.K_DELETE:
-                    board.clear()
-                    key = None
-                if event.key == pygame.K_RETURN:
-                    i, j = board.selected
-                    if board.cubes[i][j].value != EMPTY:
-                        key = None
-
-                        if board.is_board_solved():
-                            board.put_message("Puzzle solved!!!")
-                            run = False
-
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos = pygame.mouse.get_pos()
-                clicked = board.click(pos)
-                if clicked:
-                    board.select(clicked[0], clicked[1])
-                    key = None
-
-        if board.selected and key != None:
-            board.sketch(key)
-
-        board.redraw_window(win)
-        pygame.display.update()
-
-    # print full solved board
-    print("Solved board:")
-    board.pretty_print()
-
-
-if __name__ == '__main__':
-    main()
+# Main file for the binary solver
+import pygame
+
+from board import Board
+from solver import Solver
+from smt_solver import SMT_Solver
+from probing import Prober
+from search_solver import SearchSolver
+from worker import SolveWorker
+
+
+def main():
+    # information about the initial setup
+    dimension = 8
+    # number of columns, for rectangular puzzles
+    columns = dimension
+    ones_list = {}
+    zeros_list = {}
+
+    # make initial board from 0s and 1s
+    board = Board(dimension, zeros_list, ones_list, 540, 540, columns)
+    # print full initial board
+    print("Initial board:")
+    board.pretty_print()
+
+    # define solvers
+    solver = Solver(board)
+    board.add_callback(solver.update_callback)
+
+    # define solvers
+    prober = Prober(board)
+    board.add_callback(prober.update_callback)
+
+    # define solvers
+    smt_solver = SMT_Solver(board)
+    board.add_callback(smt_solver.update_callback)
+
+    # define solvers
+    search_solver = SearchSolver(board)
+    board.add_callback(search_solver.update_callback)
+
+    # the solvers run on a worker thread, the cells they put are streamed back
+    worker = SolveWorker(board)
+    board.add_callback(worker.update_callback)
+
+    def solved(result):
+        if result is None:
+            board.put_message("Solving stopped with an error")
+            return False
+        board.update_view()
+        return True
+
+    def heuristics_done(result):
+        if solved(result):
+            if result:
+                board.put_message("Solved board!")
+                board.pretty_print()
+            else:
+                board.put_message(
+                    "Not solvable via conventional methods, try F6")
+
+    def reason_done(success_message):
+        # the SMT and search steps return "" on success, otherwise the reason
+        def done(result):
+            if solved(result):
+                if result == "":
+                    board.put_message(success_message)
+                    board.pretty_print()
+                else:
+                    board.put_message(
+                        "Puzzle cannot be solved because " + result)
+        return done
+
+    def probe_then_smt():
+        # probing settles most puzzles the rules leave open, SMT only the rest
+        if prober.solve():
+            return ""
+        if prober.contradiction:
+            return "not satisfiable!"
+        return smt_solver.solve()
+
+    def probing_done(result):
+        reason_done("Solved board, {} cells by probing!".format(len(prober.deductions)))(result)
+
+    def edited(retracted):
+        # deductions that depended on the edited cell are gone, the rules go on
+        # from what is left, starting at the lines of the retracted cells
+        if not retracted or all(entry.rule == "given" for entry in retracted):
+            return
+        cells = [(entry.i, entry.j) for entry in retracted] + [board.selected]
+        if solver.resume(cells):
+            board.put_message("Edited, {} deductions retracted".format(
+                sum(1 for entry in retracted if entry.rule != "given")))
+        else:
+            board.put_message("Board is not satisfiable after this edit, press Ctrl+Z")
+        board.update_view()
+
+    # key: (message while solving, solving step, called with the result)
+    steps = {
+        pygame.K_F5: ("Solving puzzle ...", solver.solve, heuristics_done),
+        pygame.K_F6: ("Solving puzzle with probing and SMT ...", probe_then_smt,
+                      probing_done),
+        pygame.K_F7: ("Checking uniqueness ...", smt_solver.solve_board,
+                      reason_done("Unique solution found!")),
+        pygame.K_F8: ("Searching for solutions ...", search_solver.solve,
+                      reason_done("Unique solution found by search!")),
+    }
+
+    # Make window
+    pygame.font.init()
+    win = pygame.display.set_mode((540, 600))
+    pygame.display.set_caption("Binary puzzle solver")
+    clock = pygame.time.Clock()
+    run = True
+
+    while run:
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                run = False
+            if event.type == pygame.VIDEOEXPOSE:
+                board.full_redraw = True
+            if event.type == pygame.KEYDOWN:
+                edits = (pygame.K_0, pygame.K_1, pygame.K_DELETE, pygame.K_z, pygame.K_y)
+                if event.key in edits and worker.is_busy():
+                    board.put_message("Still solving, please wait ...")
+                    continue
+                if event.key in (pygame.K_0, pygame.K_1) and board.selected:
+                    edited(board.place('0' if event.key == pygame.K_0 else '1'))
+                if event.key == pygame.K_DELETE and board.selected:
+                    edited(board.clear())
+                if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                    if board.undo() is None:
+                        board.put_message("Nothing to undo")
+                if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                    if board.redo() is None:
+                        board.put_message("Nothing to redo")
+                if event.key == pygame.K_UP:
+                    board.move_up()
+                if event.key == pygame.K_DOWN:
+                    board.move_down()
+                if event.key == pygame.K_LEFT:
+                    board.move_left()
+                if event.key == pygame.K_RIGHT:
+                    board.move_right()
+                if event.key in steps:
+                    message, step, done = steps[event.key]
+                    if worker.is_busy():
+                        board.put_message("Still solving, please wait ...")
+                        continue
+                    # the cells of the step are undone together
+                    board.trail.begin(message)
+                    print("=====================================================")
+                    board.put_message(message)
+                    board.pretty_print()
+                    worker.start(step, done)
+
+                if event.key == pygame.K_RETURN and board.selected:
+                    if board.is_board_solved():
+                        board.put_message("Puzzle solved!!!")
+                        run = False
+
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                pos = pygame.mouse.get_pos()
+                clicked = board.click(pos)
+                if clicked:
+                    board.select(clicked[0], clicked[1])
+
+        # show the cells the worker has deduced since the last frame
+        worker.poll()
+
+        rects = board.redraw_window(win)
+        if rects:
+            pygame.display.update(rects)
+        clock.tick(60)
+
+    # print full solved board
+    print("Solved board:")
+    board.pretty_print()
+
+
+if __name__ == '__main__':
+    main()
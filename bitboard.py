@@ -0,0 +1,259 @@
+# Symbol of a cell that has not been filled yet
+EMPTY = '_'
+
+# Axis of a line: a row or a column of the board
+ROWS = 0
+COLS = 1
+
+
+def popcount(mask):
+    """
+    Method
+    :return number of bits set in mask
+    """
+    return bin(mask).count("1")
+
+
+def mask_bits(mask):
+    """
+    Method yields the positions of the bits set in mask
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitBoard:
+    '''Compact board: for every row and every column a mask of the known cells
+    and a mask of the cells holding '1', kept in sync on every put'''
+
+    def __init__(self, rows, cols=None):
+        self.rows = rows
+        self.cols = rows if cols is None else cols
+        # every line holds as many '0' as '1', the engines assume even lines
+        if self.rows % 2 or self.cols % 2:
+            raise ValueError("A binary puzzle needs an even number of rows and columns, "
+                             "not {}x{}".format(self.rows, self.cols))
+        # known[axis][k] and ones[axis][k] describe line k of the given axis,
+        # bit j of a row mask is column j, bit i of a column mask is row i
+        self.known = [[0] * self.rows, [0] * self.cols]
+        self.ones = [[0] * self.rows, [0] * self.cols]
+        # completed[axis] maps the ones mask of every completed line of the axis to
+        # the number of such lines, so that duplicates are found with one lookup
+        self.completed = [{}, {}]
+        # (rule, antecedents) of the puts being made, set by the solvers for the
+        # callbacks that record deductions (see trail.py), None for a given.
+        # antecedents is a tuple of (axis, k, mask): the cells of mask in line k
+        self.cause = None
+
+        # Callbacks to be called whenever the board is modified
+        self.update_callbacks = []
+
+    @classmethod
+    def from_grid(cls, grid):
+        """
+        Method builds a board out of a list of rows of '0', '1' and EMPTY
+        """
+        bits = cls(len(grid), len(grid[0]) if grid else 0)
+        for i, row in enumerate(grid):
+            for j, value in enumerate(row):
+                bits._store(value, i, j)
+        return bits
+
+    @classmethod
+    def from_masks(cls, rows, cols, known, ones):
+        """
+        Method builds a board out of two whole-board masks, bit i * cols + j of
+        known (resp. ones) is set if cell (i, j) is filled (resp. holds '1')
+        """
+        bits = cls(rows, cols)
+        full_row = (1 << cols) - 1
+        for i in range(rows):
+            row_known = (known >> (i * cols)) & full_row
+            row_ones = (ones >> (i * cols)) & full_row
+            bits.known[ROWS][i] = row_known
+            bits.ones[ROWS][i] = row_ones
+            for j in mask_bits(row_known):
+                bits.known[COLS][j] |= 1 << i
+            for j in mask_bits(row_ones):
+                bits.ones[COLS][j] |= 1 << i
+        bits._index_lines()
+        return bits
+
+    def to_masks(self):
+        """
+        Method
+        :return (known, ones) whole-board masks as read by from_masks
+        """
+        known = 0
+        ones = 0
+        for i in range(self.rows - 1, -1, -1):
+            known = (known << self.cols) | self.known[ROWS][i]
+            ones = (ones << self.cols) | self.ones[ROWS][i]
+        return known, ones
+
+    def add_callback(self, callback):
+        self.update_callbacks.append(callback)
+
+    def line_length(self, axis):
+        """
+        Method
+        :return number of cells in a line of the given axis
+        """
+        return self.cols if axis == ROWS else self.rows
+
+    def line_count(self, axis):
+        """
+        Method
+        :return number of lines along the given axis
+        """
+        return self.rows if axis == ROWS else self.cols
+
+    def _index_lines(self):
+        # rebuild the index of completed lines from the masks
+        self.completed = [{}, {}]
+        for axis in (ROWS, COLS):
+            for k in range(self.line_count(axis)):
+                self._index_line(axis, k, 1)
+
+    def _index_line(self, axis, k, delta):
+        # add (delta 1) or remove (delta -1) line k to the index if it is complete
+        if self.known[axis][k] != (1 << self.line_length(axis)) - 1:
+            return
+        completed = self.completed[axis]
+        count = completed.get(self.ones[axis][k], 0) + delta
+        if count:
+            completed[self.ones[axis][k]] = count
+        else:
+            del completed[self.ones[axis][k]]
+
+    def known_lines(self):
+        """
+        Method
+        :return antecedents covering every filled cell, for deductions made from
+                the whole board
+        """
+        return tuple((ROWS, i, known) for i, known in enumerate(self.known[ROWS]) if known)
+
+    def completed_count(self, axis, ones):
+        """
+        Method
+        :return number of completed lines of the axis holding the ones mask
+        """
+        return self.completed[axis].get(ones, 0)
+
+    def is_duplicate(self, axis, k):
+        """
+        Method
+        :return True if line k is complete and equal to another line of its axis
+        """
+        known, ones = self.line(axis, k)
+        return (known == (1 << self.line_length(axis)) - 1
+                and self.completed[axis].get(ones, 0) > 1)
+
+    def has_duplicate_lines(self):
+        """
+        Method
+        :return True if two completed rows or two completed columns are equal
+        """
+        return any(count > 1 for completed in self.completed for count in completed.values())
+
+    def line(self, axis, k):
+        """
+        Method
+        :return (known, ones) masks of line k along the given axis
+        """
+        return self.known[axis][k], self.ones[axis][k]
+
+    def get(self, i, j):
+        """
+        Method
+        :return the symbol in position (i,j)
+        """
+        if not (self.known[ROWS][i] >> j) & 1:
+            return EMPTY
+        return '1' if (self.ones[ROWS][i] >> j) & 1 else '0'
+
+    def _store(self, symbol, i, j):
+        # update both views of the cell at once, and the index of completed
+        # lines for its row and column
+        row_bit = 1 << j
+        col_bit = 1 << i
+        self._index_line(ROWS, i, -1)
+        self._index_line(COLS, j, -1)
+        if symbol == EMPTY:
+            self.known[ROWS][i] &= ~row_bit
+            self.known[COLS][j] &= ~col_bit
+            self.ones[ROWS][i] &= ~row_bit
+            self.ones[COLS][j] &= ~col_bit
+            return
+        self.known[ROWS][i] |= row_bit
+        self.known[COLS][j] |= col_bit
+        if symbol == '1':
+            self.ones[ROWS][i] |= row_bit
+            self.ones[COLS][j] |= col_bit
+        else:
+            self.ones[ROWS][i] &= ~row_bit
+            self.ones[COLS][j] &= ~col_bit
+        self._index_line(ROWS, i, 1)
+        self._index_line(COLS, j, 1)
+
+    def put(self, symbol, i, j):
+        """
+        Method put symbol in position (i,j) in the board
+
+        :param symbol is either '1' or '0' (or EMPTY to clear the cell)
+        :param i is row number in the board
+        :param j is column number in the board
+        """
+        if 0 <= i < self.rows and 0 <= j < self.cols:
+            if not (self.known[ROWS][i] >> j) & 1:
+                for callback in self.update_callbacks:
+                    callback(symbol, i, j)
+            self._store(symbol, i, j)
+
+    @property
+    def board(self):
+        """
+        The board as a list of rows of symbols, built on every access
+        """
+        return [self.row_values(i) for i in range(self.rows)]
+
+    def row_values(self, i):
+        """
+        Method
+        :return row i as a list of symbols
+        """
+        return [self.get(i, j) for j in range(self.cols)]
+
+    def copy(self):
+        """
+        Method
+        :return a board with the same contents and no callbacks
+        """
+        bits = BitBoard(self.rows, self.cols)
+        bits.known = [list(self.known[ROWS]), list(self.known[COLS])]
+        bits.ones = [list(self.ones[ROWS]), list(self.ones[COLS])]
+        bits.completed = [dict(self.completed[ROWS]), dict(self.completed[COLS])]
+        return bits
+
+    def transpose(self):
+        # swapping the two views transposes the board without copying cells
+        self.rows, self.cols = self.cols, self.rows
+        self.known.reverse()
+        self.ones.reverse()
+        self.completed.reverse()
+
+    def pretty_print(self):
+        # pretty print
+        print('\n'.join([''.join(['{:4}'.format(item) for item in row])
+                         for row in self.board]))
+
+    def is_board_solved(self):
+        """
+        Method checks whether the board has been solved
+        :return True iff there are no more empty EMPTY positions left in the board
+        """
+        full_row = (1 << self.cols) - 1
+        return all(known == full_row for known in self.known[ROWS])
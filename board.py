@@ -1,98 +1,145 @@
 
 import pygame
 
-from pysmt.shortcuts import Symbol, And, Not, is_sat
-from cube import Cube, EMPTY
+from cube import Cube, get_glyph
+from bitboard import BitBoard, EMPTY
+from trail import Trail
 
-class Board:
+class Board(BitBoard):
 
-    def __init__(self, dimension, zeros, ones, width, height):
+    def __init__(self, dimension, zeros, ones, width, height, cols=None):
+        # dimension is the number of rows, cols defaults to dimension
+        BitBoard.__init__(self, dimension, cols)
         self.message = "Press F5 to start solution"
         # build the board out of zeros and ones
-        self.board = [[EMPTY for i in range(dimension)]
-                      for j in range(dimension)]
-
         for i, j in ones:
-            self.board[i - 1][j - 1] = '1'
+            self._store('1', i - 1, j - 1)
         for i, j in zeros:
-            self.board[i - 1][j - 1] = '0'
+            self._store('0', i - 1, j - 1)
 
         assert len(set(ones).intersection(set(zeros))) == 0
 
         self.width = width
         self.height = height
+        # square cells, as large as the board fits in width x height
+        self.gap = min(width / self.cols, height / self.rows)
         self.selected = None
+        # draw the whole window on the next frame, afterwards only what changed
+        self.full_redraw = True
+        self.message_dirty = True
 
-        self.rows = dimension
-        self.cols = dimension
-        self.cubes = [[Cube(self.board[i][j], i, j, self.rows, width, height)
-                       for j in range(dimension)] for i in range(dimension)]
-        
-        # Callbacks to be called whenever the board is modified
-        self.update_callbacks = []
+        self.cubes = [[Cube(self.get(i, j), i, j, self.gap)
+                       for j in range(self.cols)] for i in range(self.rows)]
 
-    def add_callback(self, callback):
-        self.update_callbacks.append(callback)
+        # every put with its cause, for undo, redo and edits that keep the
+        # deductions not depending on the edited cell
+        self.trail = Trail(self)
+        self.add_callback(self.trail.update_callback)
 
     def _draw_message(self, win):
-        fnt = pygame.font.SysFont("comicsans", 24)
-
-        gap = self.width / self.cols
-        x = gap / 4
-        y = self.rows * gap
+        x = 15
+        y = self.rows * self.gap
 
-        text = fnt.render(str(self.message), 1, (0, 0, 0))
+        # clear the space below the board before drawing the new message
+        area = pygame.Rect(0, int(y) + 1, win.get_width(), win.get_height() - int(y) - 1)
+        win.fill((255, 255, 255), area)
+        text = get_glyph(str(self.message), 24)
         win.blit(text, (x,
-                        y + (gap / 2 - text.get_height() / 2)))
-    
+                        y + (area.height / 2 - text.get_height() / 2)))
+        self.message_dirty = False
+        return area
+
     def draw(self, win):
-        # Draw Grid Lines
-        gap = self.width / self.rows
-        for i in range(self.rows + 1):
-            # if i % 3 == 0 and i != 0:
-            #     thick = 4
-            # else:
+        """
+        Method draws what changed since the last call, everything on the first call
+        or after full_redraw is set
+        :return list of the rectangles of win that were drawn
+        """
+        rects = []
+        if self.full_redraw:
+            win.fill((255, 255, 255))
+            # Draw Grid Lines
+            gap = self.gap
             thick = 1
-            pygame.draw.line(win, (0, 0, 0), (0, i * gap),
-                             (self.width, i * gap), thick)
-            pygame.draw.line(win, (0, 0, 0), (i * gap, 0),
-                             (i * gap, self.height), thick)
+            for i in range(self.rows + 1):
+                pygame.draw.line(win, (0, 0, 0), (0, i * gap),
+                                 (self.cols * gap, i * gap), thick)
+            for j in range(self.cols + 1):
+                pygame.draw.line(win, (0, 0, 0), (j * gap, 0),
+                                 (j * gap, self.rows * gap), thick)
+            for row in self.cubes:
+                for cube in row:
+                    cube.dirty = True
+            self.message_dirty = True
+            self.full_redraw = False
+            rects.append(win.get_rect())
 
         # Draw Cubes
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.cubes[i][j].draw(win)
+        for row in self.cubes:
+            for cube in row:
+                if cube.dirty:
+                    rects.append(cube.draw(win))
 
-        self._draw_message(win)
+        if self.message_dirty:
+            rects.append(self._draw_message(win))
+        return rects
 
     def redraw_window(self, win):
-        win.fill((255, 255, 255))
+        """
+        Method
+        :return list of the rectangles of win that were redrawn
+        """
         # Draw board
-        self.draw(win)
-
-    def update_board(self):
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.board[i][j] = self.cubes[i][j].value
+        return self.draw(win)
 
     def update_view(self):
         for i in range(self.rows):
             for j in range(self.cols):
-                self.cubes[i][j].value = self.board[i][j]
+                self.cubes[i][j].value = self.get(i, j)
+
+    def update_cell(self, symbol, i, j):
+        self.cubes[i][j].value = symbol
 
     def clear(self):
-        row, col = self.selected
-        self.cubes[row][col].value = EMPTY
+        """
+        Method clears the selected cell and the deductions that depend on it
+        :return the retracted trail entries, None if the cell was empty
+        """
+        return self.place(EMPTY)
 
     def place(self, val):
+        """
+        Method puts val in the selected cell, retracting its old value and the
+        deductions that depend on it
+        :return the retracted trail entries, None if the cell holds val already
+        """
         row, col = self.selected
-        self.cubes[row][col].value = val
         print("Setting cube value: (", row, ", ", col, "): ", val)
-        self.update_board()
+        retracted = self.trail.edit(val, row, col)
+        self.update_view()
+        return retracted
+
+    def undo(self):
+        """
+        Method
+        :return the undone action of the trail, None if there is none
+        """
+        action = self.trail.undo()
+        self.update_view()
+        return action
 
-        return True
+    def redo(self):
+        """
+        Method
+        :return the redone action of the trail, None if there is none
+        """
+        action = self.trail.redo()
+        self.update_view()
+        return action
 
     def put_message(self, msg):
+        if msg != self.message:
+            self.message_dirty = True
         self.message = msg
 
     def select(self, row, col):
@@ -132,53 +179,15 @@ class Board:
             self.cubes[row][col + 1].selected = True
             self.selected = (row, col + 1)
 
-    def sketch(self, val):
-        row, col = self.selected
-        self.cubes[row][col].value = val
-
     def click(self, pos):
         """
         :param: pos
         :return: (row, col)
         """
-        if pos[0] < self.width and pos[1] < self.height:
-            gap = self.width / self.rows
+        if pos[0] < self.cols * self.gap and pos[1] < self.rows * self.gap:
+            gap = self.gap
             x = pos[0] // gap
             y = pos[1] // gap
             return (int(y), int(x))
         else:
             return None
-    
-    def put(self, symbol, i, j):
-        """
-        Method put symbol in position (i,j) in the board
-
-        :param symbol is either '1' or '0' (maybe sometimes EMPTY?)
-        :param i is row number in the board
-        :param j is column number in the board
-        """
-        if i in range(len(self.board)) and j in range(len(self.board)):
-            if self.board[i][j] == EMPTY:
-                for callback in self.update_callbacks:
-                    callback(symbol, i, j)
-            self.board[i][j] = symbol
-    
-    def transpose(self):
-        self.board = [[self.board[j][i]
-                       for j in range(self.rows)] for i in range(self.cols)]
-
-    def pretty_print(self):
-        # pretty print
-        print('\n'.join([''.join(['{:4}'.format(item) for item in row])
-                         for row in self.board]))
-
-    def is_board_solved(self):
-        """
-        Method checks whether the board has been solved
-        :return True iff there are no more empty EMPTY positions left in the board
-        """
-        for row in self.board:
-            for element in row:
-                if element == EMPTY:
-                    return False
-        return True
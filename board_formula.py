@@ -0,0 +1,173 @@
+from row_formula import sequential_counter, neighbor_clauses
+from sat_backend import get_backend, DEFAULT_BACKEND
+from bitboard import EMPTY
+
+
+def distinct_clauses(backend, first, second):
+    """
+    Method adds clauses for "the two lines of variables differ in at least one
+    cell", with one auxiliary variable per cell that implies a difference there
+    """
+    differences = []
+    for a, b in zip(first, second):
+        difference = backend.new_var()
+        backend.add_clause([-difference, a, b])
+        backend.add_clause([-difference, -a, -b])
+        differences.append(difference)
+    backend.add_clause(differences)
+
+
+class BoardFormula:
+    '''Encoding of a complete board: balanced lines, no triples and no two equal
+    rows or columns, kept in one persistent solver backend'''
+
+    def __init__(self, rows, cols=None, backend=DEFAULT_BACKEND):
+        self.rows = rows
+        self.cols = rows if cols is None else cols
+        # The board constraints are added only once, givens become assumptions
+        self.solver = get_backend(backend)
+        # Create variable grid, X<i>_<j> is true iff cell (i, j) holds '1'
+        self.var_grid = [[self.solver.new_var("X{}_{}".format(i + 1, j + 1))
+                          for j in range(self.cols)] for i in range(self.rows)]
+        row_lines = self.var_grid
+        col_lines = [[self.var_grid[i][j] for i in range(self.rows)]
+                     for j in range(self.cols)]
+
+        for line in row_lines + col_lines:
+            sequential_counter(self.solver, line, len(line) - int(len(line) / 2))
+            neighbor_clauses(self.solver, line)
+
+        # No two rows and no two columns may be identical
+        for lines in (row_lines, col_lines):
+            for a in range(len(lines)):
+                for b in range(a + 1, len(lines)):
+                    distinct_clauses(self.solver, lines[a], lines[b])
+
+        self.solutions = []
+
+    def _assumptions(self, grid):
+        assumptions = []
+        for i in range(self.rows):
+            for j in range(self.cols):
+                if grid[i][j] == '1':
+                    assumptions.append(self.var_grid[i][j])
+                elif grid[i][j] == '0':
+                    assumptions.append(-self.var_grid[i][j])
+        return assumptions
+
+    def push(self):
+        self.solver.push()
+
+    def pop(self):
+        self.solver.pop()
+
+    def add_blocking_clause(self, solution):
+        """
+        Method excludes solution, a list of rows of '0' and '1', from all later
+        queries until the enclosing frame is popped
+        """
+        self.solver.add_clause([-var if value == '1' else var
+                                for var_row, row in zip(self.var_grid, solution)
+                                for var, value in zip(var_row, row)])
+
+    def is_satisfiable(self, grid):
+        """
+        Method
+        :return True if grid can be completed, in a single solver call
+        """
+        return self.solver.solve(self._assumptions(grid))
+
+    def _current_solution(self):
+        return [['1' if self.solver.value(var) else '0' for var in row]
+                for row in self.var_grid]
+
+    def iter_solutions(self, grid, max_solutions=None):
+        """
+        Method yields the completions of grid one at a time, each a list of rows.
+        The givens are passed as assumptions and blocking clauses live in a frame
+        that is popped when the enumeration ends or is closed.
+
+        :param grid is a list of rows of '0', '1' and EMPTY symbols
+        :param max_solutions stops the enumeration after that many solutions
+        """
+        assumptions = self._assumptions(grid)
+        found = 0
+        self.solver.push()
+        try:
+            while max_solutions is None or found < max_solutions:
+                if not self.solver.solve(assumptions):
+                    return
+                solution = self._current_solution()
+                found += 1
+                yield solution
+                # Block the found solution to find the other solutions
+                self.add_blocking_clause(solution)
+        finally:
+            self.solver.pop()
+
+    def count_solutions(self, grid, limit=2):
+        """
+        Method counts the completions of grid, stopping after limit of them
+
+        Uses at most limit solver calls, so limit=2 tells 0, 1 or "2 or more"
+        solutions apart. The solutions found are kept in self.solutions.
+
+        :param grid is a list of rows of '0', '1' and EMPTY symbols
+        :return the number of solutions found, at most limit
+        """
+        self.solutions = list(self.iter_solutions(grid, limit))
+        return len(self.solutions)
+
+    def forced_cells(self, grid):
+        """
+        Method finds the cells shared by every completion of grid, keeping only the
+        running intersection of the solutions and stopping once nothing is shared
+
+        :return a list of rows with EMPTY where solutions differ, or None if there
+                is no solution
+        """
+        empties = sum(1 for row in grid for value in row if value not in ('0', '1'))
+        common = None
+        undecided = 0
+        solutions = self.iter_solutions(grid)
+        try:
+            for solution in solutions:
+                if common is None:
+                    common = solution
+                    continue
+                for i in range(self.rows):
+                    for j in range(self.cols):
+                        if common[i][j] != EMPTY and common[i][j] != solution[i][j]:
+                            common[i][j] = EMPTY
+                            undecided += 1
+                if undecided == empties:
+                    break
+        finally:
+            solutions.close()
+        return common
+
+    def is_unique(self, grid):
+        """
+        Method
+        :return True iff grid has exactly one completion
+        """
+        return self.count_solutions(grid, 2) == 1
+
+    def get_solution(self):
+        """
+        Method
+        :return the first solution found by the last count_solutions call
+        """
+        if not self.solutions:
+            return None
+        return self.solutions[0]
+
+
+if __name__ == "__main__":
+    board = BoardFormula(4)
+    grid = [['0', EMPTY, EMPTY, EMPTY],
+            [EMPTY, EMPTY, EMPTY, EMPTY],
+            [EMPTY, EMPTY, '1', EMPTY],
+            [EMPTY, EMPTY, EMPTY, EMPTY]]
+    print("Number of solutions (at most 2): ", board.count_solutions(grid))
+    print(board.get_solution())
@@ -0,0 +1,127 @@
+# Packed on-disk format for large puzzle corpora
+#
+# A corpus file starts with a 12 byte header: the magic b"BPZ1", the number of
+# rows and of columns (unsigned 16 bit) and the number of puzzles (unsigned 32 bit),
+# all little endian. Every puzzle that follows takes the same number of bytes: the
+# mask of known cells and then the mask of ones, each ceil(rows * cols / 8) bytes
+# little endian, where bit i * cols + j stands for cell (i, j).
+import itertools
+import mmap
+import struct
+
+from bitboard import BitBoard
+
+MAGIC = b"BPZ1"
+HEADER = struct.Struct("<4sHHI")
+
+
+def mask_size(rows, cols):
+    """
+    Method
+    :return number of bytes of one whole-board mask
+    """
+    return (rows * cols + 7) // 8
+
+
+def write_corpus(path, boards):
+    """
+    Method writes boards, all of the same size, into a corpus file
+
+    :return the number of boards written
+    """
+    boards = iter(boards)
+    first = next(boards, None)
+    rows, cols = (first.rows, first.cols) if first is not None else (0, 0)
+    size = mask_size(rows, cols)
+
+    count = 0
+    with open(path, "wb") as corpus_file:
+        # the count is patched in once all boards are written
+        corpus_file.write(HEADER.pack(MAGIC, rows, cols, 0))
+        if first is not None:
+            for board in itertools.chain([first], boards):
+                if (board.rows, board.cols) != (rows, cols):
+                    raise ValueError("All boards of a corpus must have the same size")
+                known, ones = board.to_masks()
+                corpus_file.write(known.to_bytes(size, "little"))
+                corpus_file.write(ones.to_bytes(size, "little"))
+                count += 1
+        corpus_file.seek(0)
+        corpus_file.write(HEADER.pack(MAGIC, rows, cols, count))
+    return count
+
+
+class Corpus:
+    '''Read-only view of a corpus file, memory mapped so that puzzles are only
+    decoded when they are accessed'''
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            self._file.close()
+            raise ValueError("Not a puzzle corpus: " + str(path))
+
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError("Not a puzzle corpus: " + str(path))
+        magic, self.rows, self.cols, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a puzzle corpus: " + str(path))
+
+        self._mask_size = mask_size(self.rows, self.cols)
+        self._record_size = 2 * self._mask_size
+        # a truncated file would decode its last puzzles from short slices
+        if len(self._map) != HEADER.size + self.count * self._record_size:
+            self.close()
+            raise ValueError("Not a puzzle corpus: " + str(path))
+        self._view = memoryview(self._map)
+
+    def __len__(self):
+        return self.count
+
+    def masks(self, index):
+        """
+        Method
+        :return (known, ones) whole-board masks of puzzle index
+        """
+        if not 0 <= index < self.count:
+            raise IndexError("Puzzle index out of range")
+        start = HEADER.size + index * self._record_size
+        middle = start + self._mask_size
+        known = int.from_bytes(self._view[start:middle], "little")
+        ones = int.from_bytes(self._view[middle:middle + self._mask_size], "little")
+        return known, ones
+
+    def __getitem__(self, index):
+        known, ones = self.masks(index)
+        return BitBoard.from_masks(self.rows, self.cols, known, ones)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_corpus(path):
+    """
+    Method yields the boards of a corpus file one at a time
+    """
+    with Corpus(path) as corpus:
+        for board in corpus:
+            yield board
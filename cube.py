@@ -1,30 +1,77 @@
-
 import pygame
 
-EMPTY = '_'
+# EMPTY lives with the board model so that headless code never loads pygame
+from bitboard import EMPTY
+
+# Fonts and rendered glyphs, created once and shared by every cell
+_fonts = {}
+_glyphs = {}
+
+
+def get_font(size):
+    """
+    Method
+    :return the font of the given size, loaded on first use
+    """
+    font = _fonts.get(size)
+    if font is None:
+        font = pygame.font.SysFont("comicsans", size)
+        _fonts[size] = font
+    return font
+
+
+def get_glyph(text, size):
+    """
+    Method
+    :return the surface of text rendered in the font of the given size
+    """
+    glyph = _glyphs.get((text, size))
+    if glyph is None:
+        glyph = get_font(size).render(text, 1, (0, 0, 0))
+        _glyphs[(text, size)] = glyph
+    return glyph
+
 
 class Cube:
     '''Representation of a cell in a playing board'''
 
-    def __init__(self, value, row, col, dimension, width, height):
+    def __init__(self, value, row, col, gap):
         self._value = value
-        # Calculate the width (=height) of a cell
-        self._gap = width / dimension
+        # the width (=height) of a cell
+        self._gap = gap
+        # symbols shrink with the cells of large boards
+        self._font_size = min(40, int(gap * 0.8))
         # Calculate location of the cell in the window
         self._loc = (col * self._gap, row * self._gap)
+        self._end = ((col + 1) * self._gap, (row + 1) * self._gap)
         self._selected = False
+        # the cell has changed since it was last drawn
+        self.dirty = True
 
     def draw(self, win):
-        fnt = pygame.font.SysFont("comicsans", 40)
+        """
+        Method draws the cell over whatever was drawn there before
+        :return the rectangle of win that was drawn
+        """
+        (x, y), (end_x, end_y) = self._loc, self._end
+        area = pygame.Rect(int(x), int(y), int(end_x) - int(x) + 1, int(end_y) - int(y) + 1)
+        win.fill((255, 255, 255), area)
+        # the grid lines around the cell, at the same positions as Board.draw
+        for start, end in (((x, y), (end_x, y)), ((x, end_y), (end_x, end_y)),
+                           ((x, y), (x, end_y)), ((end_x, y), (end_x, end_y))):
+            pygame.draw.line(win, (0, 0, 0), start, end, 1)
 
         if self._value != EMPTY:
-            text = fnt.render(str(self._value), 1, (0, 0, 0))
-            win.blit(text, (self._loc[0] + (self._gap / 2 - text.get_width() / 2),
-                     self._loc[1] + (self._gap / 2 - text.get_height() / 2)))
+            text = get_glyph(str(self._value), self._font_size)
+            win.blit(text, (x + (self._gap / 2 - text.get_width() / 2),
+                     y + (self._gap / 2 - text.get_height() / 2)))
 
         if self.selected:
             pygame.draw.rect(
-                win, (255, 0, 0), (self._loc[0], self._loc[1], self._gap, self._gap), 3)
+                win, (255, 0, 0), (x, y, self._gap, self._gap), 3)
+
+        self.dirty = False
+        return area
 
     @property
     def selected(self):
@@ -32,6 +79,8 @@ class Cube:
 
     @selected.setter
     def selected(self, value):
+        if value != self._selected:
+            self.dirty = True
         self._selected = value
 
     @property
@@ -41,4 +90,6 @@ class Cube:
     @value.setter
     def value(self, value):
         assert(value in {'0', '1', EMPTY})
+        if value != self._value:
+            self.dirty = True
         self._value = value
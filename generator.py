@@ -0,0 +1,196 @@
+# Generator of uniquely solvable puzzles graded by the stage that solves them
+#
+#   easy    the heuristic Solver rules alone solve the puzzle
+#   medium  complete line by line deduction (what SMT_Solver does) solves it
+#   hard    only a search settles it
+import argparse
+import random
+import sys
+
+from bitboard import BitBoard, EMPTY
+from solver import Solver
+from search_solver import SearchSolver, LinePropagator
+from sat_backend import BACKENDS, DEFAULT_BACKEND
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def random_solution(rows, cols, rng):
+    """
+    Method
+    :return a random completely filled valid board
+    """
+    # beyond 16x16 cells picked at random lead to dead ends that are only found
+    # deep in the search, filling the rows in order keeps them close to their cause;
+    # a search stuck below an early bad decision restarts on its own
+    branching = "random" if rows * cols <= 256 else "first_random"
+    search = SearchSolver(BitBoard(rows, cols), branching, seed=rng.random())
+    solutions = search.iter_solutions(1)
+    try:
+        solution = next(solutions, None)
+    finally:
+        solutions.close()
+    if solution is None:
+        raise ValueError("No valid {}x{} board exists".format(rows, cols))
+    return solution
+
+
+def _propagates_to_solution(puzzle, propagator_class):
+    work = puzzle.copy()
+    propagator = propagator_class(work)
+    work.add_callback(propagator.update_callback)
+    propagator.enqueue_all()
+    return propagator.propagate() and work.is_board_solved()
+
+
+def grade(puzzle):
+    """
+    Method
+    :return "easy", "medium" or "hard", the first stage that solves the puzzle
+    """
+    if _propagates_to_solution(puzzle, Solver):
+        return "easy"
+    if _propagates_to_solution(puzzle, LinePropagator):
+        return "medium"
+    return "hard"
+
+
+class PuzzleGenerator:
+    '''Builds a random solution and removes givens for as long as the puzzle stays
+    uniquely solvable at the requested difficulty'''
+
+    def __init__(self, rows, cols=None, seed=None, backend="smt",
+                 sat_backend=DEFAULT_BACKEND):
+        self.rows = rows
+        self.cols = rows if cols is None else cols
+        self.random = random.Random(seed)
+        # "search" checks uniqueness with SearchSolver, "smt" with one BoardFormula
+        # whose solver state is kept across removal steps and puzzles
+        self.backend = backend
+        self.board_formula = None
+        if backend == "smt":
+            from board_formula import BoardFormula
+            self.board_formula = BoardFormula(self.rows, self.cols, sat_backend)
+
+    def _has_other_solution(self, puzzle, solution, i, j):
+        """
+        Method checks whether puzzle, a unique puzzle with cell (i, j) removed, now
+        has a second solution. Any such solution holds the other symbol at (i, j),
+        otherwise it would have been a second solution before the removal.
+        """
+        trial = puzzle.copy()
+        trial.put('1' if solution.get(i, j) == '0' else '0', i, j)
+        # most trials already fail, or come out solved, by line deduction alone
+        work = trial.copy()
+        propagator = LinePropagator(work)
+        work.add_callback(propagator.update_callback)
+        propagator.enqueue_all()
+        if not propagator.propagate():
+            return False
+        if work.is_board_solved():
+            return True
+        if self.board_formula is not None:
+            return self.board_formula.is_satisfiable(trial.board)
+        return SearchSolver(trial).count_solutions(1) > 0
+
+    def _keeps_difficulty(self, puzzle, solution, i, j, difficulty):
+        if difficulty == "easy":
+            return _propagates_to_solution(puzzle, Solver)
+        if difficulty == "medium":
+            return _propagates_to_solution(puzzle, LinePropagator)
+        return not self._has_other_solution(puzzle, solution, i, j)
+
+    def reduce(self, solution, difficulty):
+        """
+        Method removes givens from solution in random order, keeping each removal
+        only if the puzzle is still uniquely solvable within difficulty
+
+        :return the reduced puzzle
+        """
+        puzzle = solution.copy()
+        cells = [(i, j) for i in range(self.rows) for j in range(self.cols)]
+        self.random.shuffle(cells)
+
+        if self.board_formula is not None:
+            # the solution stays blocked for every removal step of this puzzle
+            self.board_formula.push()
+            self.board_formula.add_blocking_clause(solution.board)
+        try:
+            for i, j in cells:
+                puzzle.put(EMPTY, i, j)
+                if not self._keeps_difficulty(puzzle, solution, i, j, difficulty):
+                    puzzle.put(solution.get(i, j), i, j)
+        finally:
+            if self.board_formula is not None:
+                self.board_formula.pop()
+        return puzzle
+
+    def generate(self, difficulty="hard", attempts=20):
+        """
+        Method
+        :return (puzzle, solution) where puzzle is graded as difficulty, or None if
+                no such puzzle was found within attempts
+        """
+        for _ in range(attempts):
+            solution = random_solution(self.rows, self.cols, self.random)
+            puzzle = self.reduce(solution, difficulty)
+            if grade(puzzle) == difficulty:
+                return puzzle, solution
+        return None
+
+    def generate_many(self, count, difficulty="hard", attempts=20):
+        """
+        Method yields count (puzzle, solution) pairs of the given difficulty
+
+        :raise ValueError if attempts random solutions give no such puzzle, some
+               sizes have no puzzle of some difficulty at all
+        """
+        for _ in range(count):
+            result = self.generate(difficulty, attempts)
+            if result is None:
+                raise ValueError("No {} {}x{} puzzle found in {} attempts".format(
+                    difficulty, self.rows, self.cols, attempts))
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate uniquely solvable binary puzzles")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--cols", type=int, help="number of columns if not square")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--difficulty", default="hard", choices=DIFFICULTIES)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--attempts", type=int, default=20,
+                        help="random solutions tried per puzzle before giving up")
+    parser.add_argument("--backend", default="smt", choices=["search", "smt"])
+    parser.add_argument("--sat-backend", default=DEFAULT_BACKEND, choices=sorted(BACKENDS),
+                        help="solver backend of the smt uniqueness check")
+    parser.add_argument("--output", help="text file, or .bpz corpus (default: stdout)")
+    args = parser.parse_args(argv)
+
+    generator = PuzzleGenerator(args.size, args.cols, args.seed, args.backend,
+                                args.sat_backend)
+    puzzles = (puzzle for puzzle, _ in generator.generate_many(args.count, args.difficulty,
+                                                                    args.attempts))
+
+    if args.output and args.output.endswith(".bpz"):
+        from corpus import write_corpus
+        try:
+            write_corpus(args.output, puzzles)
+        except ValueError as error:
+            sys.exit(str(error))
+        return
+
+    stream = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for puzzle in puzzles:
+            stream.write('/'.join(''.join(row) for row in puzzle.board) + "\n")
+    except ValueError as error:
+        sys.exit(str(error))
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Bounded cache of line deductions shared by the solvers
+#
+# A key is (kind, length, known, ones): the masks of a partially filled line and
+# the kind of deduction made on it, "rules" for the heuristic Solver rules and
+# "lines" for the cells shared by all valid completions (the same for every line
+# engine). The value is what the deduction left on the line, see the solvers.
+import collections
+import json
+import os
+
+# number of lines kept by get_line_cache
+DEFAULT_SIZE = 100000
+
+
+class LineCache:
+    '''Least recently used mapping from partial lines to their deductions, with
+    hit and miss counters and optional persistence to a JSON file'''
+
+    # what the entries are, a file of another kind is refused by load
+    contents = "lines"
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def lookup(self, key, compute):
+        """
+        Method
+        :return the cached value of key, or compute() which is then cached
+        """
+        try:
+            return self[key]
+        except KeyError:
+            value = compute()
+            self[key] = value
+            return value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+    def save(self, path):
+        """
+        Method writes the entries, least recently used first, to a JSON file
+        """
+        entries = [self._encode(key, value) for key, value in self.entries.items()]
+        # written next to the target and renamed, so readers never see half a file
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, "w") as cache_file:
+            json.dump({"version": 1, "contents": self.contents, "entries": entries}, cache_file)
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """
+        Method adds the entries of a file written by save, a missing file is skipped
+
+        :return the number of entries read
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path) as cache_file:
+            data = json.load(cache_file)
+        # files without contents were written before there were other caches
+        if data.get("version") != 1 or data.get("contents", "lines") != self.contents:
+            raise ValueError("Not a {} cache: {}".format(self.contents, path))
+        for entry in data["entries"]:
+            key, value = self._decode(entry)
+            self[key] = value
+        return len(data["entries"])
+
+    def _encode(self, key, value):
+        # one entry as a JSON list
+        return list(key) + ([None, None] if value is None else list(value))
+
+    def _decode(self, entry):
+        kind, length, known, ones, forced, forced_ones = entry
+        return (kind, length, known, ones), None if forced is None else (forced, forced_ones)
+
+    def to_dict(self):
+        return {"size": len(self.entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+
+_line_cache = None
+
+
+def get_line_cache():
+    """
+    Method
+    :return the line cache shared by the solvers of this process
+    """
+    global _line_cache
+    if _line_cache is None:
+        _line_cache = LineCache()
+    return _line_cache
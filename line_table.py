@@ -0,0 +1,232 @@
+
+from bitboard import EMPTY
+
+# Tables are built once per dimension and shared by every solver
+_line_tables = {}
+
+# Longest lines whose valid lines are enumerated, their number grows by about 2.5
+# for every two cells (1296 for 16 cells, 8196 for 20), longer lines use LineDP
+TABLE_LIMIT = 16
+
+
+def get_line_table(dimension):
+    """
+    Method returns the (cached) line solver for lines of length dimension, a
+    LineTable up to TABLE_LIMIT cells and a LineDP beyond
+    """
+    table = _line_tables.get(dimension)
+    if table is None:
+        table = LineTable(dimension) if dimension <= TABLE_LIMIT else LineDP(dimension)
+        _line_tables[dimension] = table
+    return table
+
+
+def line_to_masks(values):
+    """
+    Method converts a line of symbols into a pair of bitmasks
+
+    :param values is a list of '0', '1' and EMPTY symbols
+    :return (known, ones) where bit j is set if cell j is known (resp. '1')
+    """
+    known = 0
+    ones = 0
+    for j, value in enumerate(values):
+        if value == '1':
+            known |= 1 << j
+            ones |= 1 << j
+        elif value == '0':
+            known |= 1 << j
+    return known, ones
+
+
+def masks_to_line(dimension, known, ones):
+    """
+    Method converts a pair of bitmasks back into a list of symbols
+    """
+    line = []
+    for j in range(dimension):
+        if not (known >> j) & 1:
+            line.append(EMPTY)
+        elif (ones >> j) & 1:
+            line.append('1')
+        else:
+            line.append('0')
+    return line
+
+
+class LineTable:
+    '''All valid lines (balanced, no three equal neighbours) of one dimension'''
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.full_mask = (1 << dimension) - 1
+        # Every valid line as an integer, bit j holds the value of cell j
+        self.lines = self._enumerate()
+
+    def _enumerate(self):
+        """
+        Method enumerates the valid lines depth first, pruning on the number
+        of ones and zeros and on runs of three equal symbols
+        """
+        half = self.dimension // 2
+        lines = []
+        # (position, mask, ones placed, zeros placed, previous two cells)
+        stack = [(0, 0, 0, 0, None, None)]
+        while stack:
+            pos, mask, ones, zeros, before, last = stack.pop()
+            if pos == self.dimension:
+                lines.append(mask)
+                continue
+            for bit in (0, 1):
+                if bit == 1 and ones == half:
+                    continue
+                if bit == 0 and zeros == self.dimension - half:
+                    continue
+                if before == last == bit:
+                    continue
+                stack.append((pos + 1, mask | (bit << pos),
+                              ones + bit, zeros + 1 - bit, last, bit))
+        lines.sort()
+        return lines
+
+    def matches(self, known, ones, max_solutions=None):
+        """
+        Method yields every valid line agreeing with the known cells
+
+        :param max_solutions stops the enumeration after that many lines
+        """
+        found = 0
+        for line in self.lines:
+            if (line ^ ones) & known == 0:
+                yield line
+                found += 1
+                if found == max_solutions:
+                    return
+
+    def deduce(self, known, ones):
+        """
+        Method finds the cells shared by all valid completions of a line
+
+        :param known is the mask of filled cells
+        :param ones is the mask of cells holding '1'
+        :return (forced, forced_ones) masks, or None if no completion exists
+        """
+        common_ones = self.full_mask
+        common_zeros = self.full_mask
+        found = False
+        for line in self.matches(known, ones):
+            found = True
+            common_ones &= line
+            common_zeros &= ~line
+            # stop early once no empty cell is shared by all lines seen so far
+            if not (common_ones | common_zeros) & self.full_mask & ~known:
+                break
+        if not found:
+            return None
+        return (common_ones | common_zeros) & self.full_mask, common_ones
+
+    def solve_line(self, values):
+        """
+        Method mirrors RowFormula.get_solution for a list of symbols
+
+        :return the partial solution, or None if the line is not satisfiable
+        """
+        known, ones = line_to_masks(values)
+        result = self.deduce(known, ones)
+        if result is None:
+            return None
+        return masks_to_line(self.dimension, result[0], result[1])
+
+
+class LineDP:
+    '''Finds the same cells as LineTable.deduce without enumerating the valid lines,
+    by a forward and a backward pass over the cells of the line
+
+    After each cell a line is in one of four states: its last symbol ('0' or '1')
+    and whether that symbol ends a run of one or of two cells. For every state the
+    numbers of ones with which it is reachable are kept as the bits of an integer,
+    so a pass costs a few integer operations per cell.'''
+
+    # states: last symbol '0' once, '0' twice, '1' once, '1' twice
+    ZERO, ZERO_ZERO, ONE, ONE_ONE = range(4)
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.full_mask = (1 << dimension) - 1
+        self.half = dimension // 2
+        # numbers of ones allowed after position p cells: at most half, and at
+        # least p - (dimension - half) so that the zeros fit as well
+        self.count_masks = []
+        for p in range(dimension + 1):
+            low = max(0, p - (dimension - self.half))
+            self.count_masks.append(((1 << (self.half + 1)) - 1) & ~((1 << low) - 1))
+
+    def _forward(self, states, p, zero, one):
+        # states after cell p, from the states before it
+        if p == 0:
+            step = (1 if zero else 0, 0, 2 if one else 0, 0)
+        else:
+            step = (states[self.ONE] | states[self.ONE_ONE] if zero else 0,
+                    states[self.ZERO] if zero else 0,
+                    (states[self.ZERO] | states[self.ZERO_ZERO]) << 1 if one else 0,
+                    states[self.ONE] << 1 if one else 0)
+        count_mask = self.count_masks[p + 1]
+        return tuple(counts & count_mask for counts in step)
+
+    def _backward(self, states, zero, one):
+        # states before a cell from which the states after it are reached
+        return ((states[self.ZERO_ZERO] if zero else 0) | (states[self.ONE] >> 1 if one else 0),
+                states[self.ONE] >> 1 if one else 0,
+                (states[self.ZERO] if zero else 0) | (states[self.ONE_ONE] >> 1 if one else 0),
+                states[self.ZERO] if zero else 0)
+
+    def deduce(self, known, ones):
+        """
+        Method finds the cells shared by all valid completions of a line
+
+        :param known is the mask of filled cells
+        :param ones is the mask of cells holding '1'
+        :return (forced, forced_ones) masks, or None if no completion exists
+        """
+        n = self.dimension
+        allowed = [(not (known >> p) & 1 or not (ones >> p) & 1,
+                    not (known >> p) & 1 or (ones >> p) & 1) for p in range(n)]
+
+        # backward[p]: states after p cells from which the line can be completed
+        backward = [None] * (n + 1)
+        backward[n] = (1 << self.half,) * 4
+        for p in range(n - 1, 0, -1):
+            backward[p] = self._backward(backward[p + 1], *allowed[p])
+
+        forced = 0
+        forced_ones = 0
+        states = None
+        for p in range(n):
+            zero, one = allowed[p]
+            # the symbols of cell p that lead to a state completing the line
+            after_zero = self._forward(states, p, zero, False)
+            after_one = self._forward(states, p, False, one)
+            reach = backward[p + 1]
+            can_zero = any(a & b for a, b in zip(after_zero, reach))
+            can_one = any(a & b for a, b in zip(after_one, reach))
+            if not (can_zero or can_one):
+                return None
+            if not can_zero:
+                forced |= 1 << p
+                forced_ones |= 1 << p
+            elif not can_one:
+                forced |= 1 << p
+            states = self._forward(states, p, can_zero, can_one)
+        return forced, forced_ones
+
+    def solve_line(self, values):
+        """
+        Method mirrors RowFormula.get_solution for a list of symbols
+
+        :return the partial solution, or None if the line is not satisfiable
+        """
+        known, ones = line_to_masks(values)
+        result = self.deduce(known, ones)
+        if result is None:
+            return None
+        return masks_to_line(self.dimension, result[0], result[1])
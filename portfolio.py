@@ -0,0 +1,207 @@
+# Portfolio solving: several strategies race on the same puzzle, each in its own
+# process
+#
+# How long a strategy takes varies by orders of magnitude from puzzle to puzzle,
+# and no strategy is fastest on all of them. So all of them start at once and the
+# first definitive answer wins: the unique solution, no solution, or more than one
+# solution. The other processes are terminated then, and all of them once the
+# global timeout has passed. A strategy that gets stuck (the heuristic rules,
+# probing and the line solver can) only counts if no strategy answers.
+import contextlib
+import functools
+import io
+import multiprocessing
+import multiprocessing.connection
+import time
+
+from bitboard import BitBoard, ROWS, mask_bits
+from line_table import get_line_table
+from probing import Prober
+from sat_backend import DEFAULT_BACKEND
+from solver import Solver
+from smt_solver import SMT_Solver
+from search_solver import SearchSolver
+
+DEFAULT_STRATEGIES = ["heuristics", "probing", "lines", "board", "search", "search_first",
+                      "search_random"]
+# seconds a race may take by default
+DEFAULT_TIMEOUT = 10.0
+
+# answers that settle a puzzle, the rest of the strategies is cancelled on them
+DEFINITIVE = ("solved", "unsatisfiable", "multiple")
+
+# result strings of SMT_Solver and SearchSolver
+OUTCOMES = {"": "solved", "not satisfiable!": "unsatisfiable",
+            "multiple solutions possible!": "multiple"}
+
+
+def _rules(board):
+    solver = Solver(board)
+    board.add_callback(solver.update_callback)
+    solver.solve()
+    return not solver.contradiction
+
+
+def _settled(board):
+    # the rules and the line solver fill lines one by one and may repeat one
+    if board.has_duplicate_lines():
+        return "unsatisfiable"
+    return "solved" if board.is_board_solved() else "unsolved"
+
+
+def _heuristics(board, backend):
+    if not _rules(board):
+        return "unsatisfiable"
+    return _settled(board)
+
+
+def _probing(board, backend):
+    if not _rules(board):
+        return "unsatisfiable"
+    prober = Prober(board)
+    board.add_callback(prober.update_callback)
+    prober.solve()
+    if prober.contradiction:
+        return "unsatisfiable"
+    return _settled(board)
+
+
+def _lines(board, backend):
+    if not _rules(board):
+        return "unsatisfiable"
+    outcome = SMT_Solver(board, backend=backend).solve()
+    if outcome == "not satisfiable!":
+        return "unsatisfiable"
+    return _settled(board)
+
+
+def _board(board, backend):
+    return OUTCOMES[SMT_Solver(board, backend=backend).solve_board()]
+
+
+def _search(branching, board, backend):
+    return OUTCOMES[SearchSolver(board, branching, seed=0).solve()]
+
+
+# name: function(board, backend) that solves board in place and returns
+# "solved", "unsatisfiable", "multiple" or "unsolved"
+STRATEGIES = {
+    "heuristics": _heuristics,
+    "probing": _probing,
+    "lines": _lines,
+    "board": _board,
+    "search": functools.partial(_search, "constrained"),
+    "search_first": functools.partial(_search, "first"),
+    "search_random": functools.partial(_search, "random"),
+}
+
+
+def _run(name, rows, cols, known, ones, backend, connection):
+    # entry point of a strategy process, sends (status, known, ones) back
+    board = BitBoard.from_masks(rows, cols, known, ones)
+    with contextlib.redirect_stdout(io.StringIO()):
+        status = STRATEGIES[name](board, backend)
+    connection.send((status,) + board.to_masks())
+    connection.close()
+
+
+class Portfolio:
+    '''Races the strategies on a puzzle in separate processes, see the comment at
+    the top of the module'''
+
+    def __init__(self, strategies=None, timeout=DEFAULT_TIMEOUT, backend=DEFAULT_BACKEND):
+        for name in strategies or ():
+            if name not in STRATEGIES:
+                raise ValueError("Unknown strategy: " + str(name))
+        self.strategies = list(strategies or DEFAULT_STRATEGIES)
+        # seconds until all strategies are cancelled, None for no limit
+        self.timeout = timeout
+        # solver backend of the SAT based strategies, see sat_backend.py
+        self.backend = backend
+        # (strategy, status, seconds) of every answer of the last race, in order
+        self.answers = []
+
+    def _start(self, board):
+        # one process and one pipe per strategy, forked processes find the line
+        # tables built here
+        get_line_table(board.rows)
+        get_line_table(board.cols)
+        known, ones = board.to_masks()
+        running = {}
+        for name in self.strategies:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_run, args=(name, board.rows, board.cols, known, ones, self.backend,
+                                   sender), daemon=True)
+            process.start()
+            # only the child writes, its end of the pipe closes when it exits
+            sender.close()
+            running[receiver] = (name, process)
+        return running
+
+    def _stop(self, running):
+        for receiver, (name, process) in running.items():
+            if process.is_alive():
+                process.terminate()
+        for receiver, (name, process) in running.items():
+            process.join()
+            receiver.close()
+
+    def solve(self, board):
+        """
+        Method runs the race and fills in the cells of the winning strategy, or of
+        the strategy that got furthest if none gave a definitive answer
+
+        :return dict with the status ("solved", "unsatisfiable", "unsolved" or
+                "timeout"), the strategy that settled it as stage and whether more
+                than one solution is possible, as batch.solve_board
+        """
+        result = {"status": "unsolved", "stage": None, "multiple_solutions": False}
+        self.answers = []
+        start = time.perf_counter()
+        deadline = None if self.timeout is None else start + self.timeout
+        running = self._start(board)
+        waiting = dict(running)
+        # (cells filled, strategy, known, ones) of the best undecided answer
+        best = None
+        try:
+            while waiting:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    result["status"] = "timeout"
+                    break
+                ready = multiprocessing.connection.wait(list(waiting), remaining)
+                for receiver in ready:
+                    name, process = waiting.pop(receiver)
+                    try:
+                        status, known, ones = receiver.recv()
+                    except EOFError:
+                        # the process died without an answer
+                        status, known, ones = "failed", None, None
+                    self.answers.append((name, status, time.perf_counter() - start))
+                    if status in DEFINITIVE:
+                        # the cells of a contradiction are of no use
+                        best = None if status == "unsatisfiable" else (None, name, known, ones)
+                        result.update(stage=name, multiple_solutions=status == "multiple",
+                                      status="unsolved" if status == "multiple" else status)
+                        waiting = {}
+                        break
+                    if status == "unsolved":
+                        filled = bin(known).count("1")
+                        if best is None or filled > best[0]:
+                            best = (filled, name, known, ones)
+        finally:
+            self._stop(running)
+
+        if best is not None:
+            if result["stage"] is None:
+                result["stage"] = best[1]
+            self._fill(board, best[2], best[3])
+        return result
+
+    def _fill(self, board, known, ones):
+        # put the cells of the answer that the board does not know yet
+        answer = BitBoard.from_masks(board.rows, board.cols, known, ones)
+        for i in range(board.rows):
+            for j in mask_bits(answer.known[ROWS][i] & ~board.known[ROWS][i]):
+                board.put(answer.get(i, j), i, j)
@@ -0,0 +1,139 @@
+# Failed literal probing: a solving stage between the heuristic rules and the SMT
+# line solver
+#
+# Every empty cell is tried with '0' and with '1' on a copy of the board and the
+# four rules of Solver are run to a fixpoint. A value whose branch runs into a
+# contradiction is impossible, so the cell gets the other value; cells on which
+# both branches agree are forced as well.
+from bitboard import ROWS, EMPTY, mask_bits, popcount
+from solver import Solver
+
+# number of probes (one per value tried) a solve may make by default
+DEFAULT_BUDGET = 2000
+
+
+class Prober:
+    '''Settles cells by probing both of their values with the heuristic rules,
+    within a budget of probes'''
+
+    def __init__(self, board, budget=DEFAULT_BUDGET, stats=None, cache=None):
+        self.board = board
+        # probes allowed per solve, None for no limit
+        self.budget = budget
+        # optional SolverStats and LineCache
+        self.stats = stats
+        self.cache = cache
+        # spreads every deduction over the board with the rules
+        self.propagator = Solver(board, stats, cache)
+        self.is_board_updated = False
+        self.contradiction = False
+        self.probes = 0
+        # (row, column, symbol, "failed" or "agreed") of every cell probing set
+        self.deductions = []
+
+    def update_callback(self, symbol, i, j):
+        self.is_board_updated = True
+        self.propagator.update_callback(symbol, i, j)
+
+    def _branch(self, i, j, value):
+        """
+        Method
+        :return a copy of the board with value in (i, j) and the rules run to a
+                fixpoint, or None if that leads to a contradiction
+        """
+        self.probes += 1
+        work = self.board.copy()
+        solver = Solver(work, cache=self.cache)
+        work.add_callback(solver.update_callback)
+        work.put(value, i, j)
+        if not solver.propagate():
+            return None
+        return work
+
+    def _fix(self, i, j, symbol, reason):
+        if self.board.get(i, j) == EMPTY:
+            self.deductions.append((i, j, symbol, reason))
+            # a probe follows the rules across the whole board
+            self.board.cause = ("probing", self.board.known_lines())
+            self.board.put(symbol, i, j)
+
+    def probe(self, i, j):
+        """
+        Method probes both values of the empty cell (i, j) and puts what follows
+
+        :return False if the board turned out not to be satisfiable
+        """
+        zero = self._branch(i, j, '0')
+        one = self._branch(i, j, '1')
+        if zero is None and one is None:
+            return False
+        if zero is None:
+            self._fix(i, j, '1', "failed")
+        elif one is None:
+            self._fix(i, j, '0', "failed")
+        else:
+            for row in range(self.board.rows):
+                agreed = (zero.known[ROWS][row] & one.known[ROWS][row]
+                          & ~(zero.ones[ROWS][row] ^ one.ones[ROWS][row])
+                          & ~self.board.known[ROWS][row])
+                for col in mask_bits(agreed):
+                    self._fix(row, col, zero.get(row, col), "agreed")
+        return self.propagator.propagate()
+
+    def _probe_all(self):
+        # probes the empty cells until a whole pass deduces nothing
+        progress = True
+        while progress and not self.board.is_board_solved():
+            progress = False
+            for i in range(self.board.rows):
+                for j in range(self.board.cols):
+                    if (self.board.known[ROWS][i] >> j) & 1:
+                        continue
+                    if self.budget is not None and self.probes + 2 > self.budget:
+                        return
+                    deduced = len(self.deductions)
+                    if not self.probe(i, j):
+                        self.contradiction = True
+                        return
+                    progress = progress or len(self.deductions) > deduced
+
+    # Returns False if no complete solution was found
+    def solve(self):
+        self.is_board_updated = False
+        self.contradiction = False
+        self.probes = 0
+        self.deductions = []
+        start = self.stats.clock() if self.stats is not None else 0
+        known = sum(popcount(mask) for mask in self.board.known[ROWS])
+
+        # the rules first, probing only starts from their fixpoint
+        self.propagator.clear_worklist()
+        self.propagator.enqueue_all()
+        if not self.propagator.propagate():
+            self.contradiction = True
+        else:
+            self._probe_all()
+
+        if self.stats is not None:
+            self.stats.record("probing",
+                              sum(popcount(mask) for mask in self.board.known[ROWS]) - known,
+                              self.stats.clock() - start)
+            self.stats.count("probes", self.probes)
+            self.stats.count("failed_literals",
+                             sum(1 for deduction in self.deductions if deduction[3] == "failed"))
+
+        if self.contradiction:
+            print("Board is not satisfiable!!!\n")
+            return False
+        print("Probing deduced {} cells ({} failed literals) with {} probes".format(
+            len(self.deductions),
+            sum(1 for deduction in self.deductions if deduction[3] == "failed"), self.probes))
+        if self.board.is_board_solved():
+            print("Solution found!!!")
+            return True
+        elif not self.is_board_updated:
+            print("No progress made with probing!!!\n")
+            return False
+        else:
+            print("Finding a solutions with probing stopped!!!\n")
+            return False
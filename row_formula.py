@@ -1,112 +1,174 @@
-
 import itertools
-from pysmt.shortcuts import Symbol, Bool, And, Or, Not, Implies, Iff
-from pysmt.shortcuts import Solver, is_sat, get_model, get_atoms
+
+from sat_backend import get_backend, DEFAULT_BACKEND
+
+
+def sequential_counter(backend, var_list, count):
+    """
+    Method adds clauses for "exactly count variables are true" with a sequential
+    counter, using O(n * count) auxiliary variables and clauses
+
+    Register r[i][j] is true iff at least j + 1 of the first i + 1 variables are true
+    """
+    # registers[j] stands for "at least j + 1 of the variables seen so far"
+    registers = [None] * (count + 1)
+    for i, var in enumerate(var_list):
+        new_registers = []
+        for j in range(count + 1):
+            register = backend.new_var()
+            before = registers[j]
+            below = registers[j - 1] if j > 0 else None
+            # register <-> before or (var and below), a missing before is false and
+            # a missing below (j == 0) is true
+            if before is not None:
+                backend.add_clause([-before, register])
+            if j == 0:
+                backend.add_clause([-var, register])
+            elif below is not None:
+                backend.add_clause([-var, -below, register])
+            backend.add_clause([-register, var] + [other for other in (before,) if other])
+            if j > 0:
+                backend.add_clause([-register] + [other for other in (before, below) if other])
+            new_registers.append(register)
+        registers = new_registers
+
+    # at least count, but not count + 1
+    if count > 0:
+        backend.add_clause([registers[count - 1]])
+    backend.add_clause([-registers[count]])
+
+
+def combinations_counter(backend, var_list, count):
+    """
+    Method adds clauses for "exactly count variables are true" by enumerating
+    subsets: no count + 1 variables are all true and no len - count + 1 are all false
+    """
+    for subset in itertools.combinations(var_list, count + 1):
+        backend.add_clause([-var for var in subset])
+    for subset in itertools.combinations(var_list, len(var_list) - count + 1):
+        backend.add_clause(list(subset))
+
+
+def neighbor_clauses(backend, var_list):
+    """
+    Method adds clauses for "no three neighbouring variables have the same value"
+    """
+    for i in range(0, len(var_list) - 2):
+        triple = var_list[i:i + 3]
+        backend.add_clause(list(triple))
+        backend.add_clause([-var for var in triple])
 
 
 class RowFormula:
 
-    def __init__(self, dimension):
+    def __init__(self, dimension, encoding="combinations", backend=DEFAULT_BACKEND):
         self.dimension = dimension
+        self.encoding = encoding
         self.environment = None
+        # work done so far, read by the solver statistics
+        self.solver_calls = 0
+        self.models = 0
+        # the clauses live in a backend, see sat_backend.py
+        self.backend = get_backend(backend)
         # Create variable list
         self.var_list = []
         for i in range(1, self.dimension+1):
-            self.var_list.append(Symbol("A"+str(i)))
-
-        # print(self.var_list)
-
-        # Create formulae satisfiable iff exactly half the symbols are true and half are false
-        negation_combinations = list(itertools.combinations(
-            set(self.var_list), int(self.dimension / 2)))
-        half_disjunction_formula = Bool(False)
-        for negation_comb in negation_combinations:
-            intact_comb = set(self.var_list).difference(set(negation_comb))
-            half_formula_conjunction = And(
-                [And([var for var in intact_comb]), And([Not(var) for var in negation_comb])])
-            half_disjunction_formula = Or(
-                [half_disjunction_formula, half_formula_conjunction])
-
-        # print(half_disjunction_formula)
-
-        # Create formulae satisfiable if at most two neighbors have the same logical value
-        # Formula expressed for neighboring triples
-        neighbor_conjunction_formula = Bool(True)
-        for i in range(0, self.dimension-2):
-            neighbor_subformula = And(
-                [Implies(And([self.var_list[i], self.var_list[i+1]]), Not(self.var_list[i+2])),
-                 Implies(And([Not(self.var_list[i]), Not(
-                     self.var_list[i+1])]), self.var_list[i+2]),
-                 Implies(And([self.var_list[i+1], self.var_list[i+2]]),
-                         Not(self.var_list[i])),
-                 Implies(And([Not(self.var_list[i+1]), Not(self.var_list[i+2])]), self.var_list[i])])
-            neighbor_conjunction_formula = And(
-                [neighbor_conjunction_formula, neighbor_subformula])
-
-        # print(neighbor_conjunction_formula)
-
-        # The full formula for a row or column of size self.dimension
-        self.full_formula = And(
-            [half_disjunction_formula, neighbor_conjunction_formula])
+            self.var_list.append(self.backend.new_var("A"+str(i)))
+
+        # Clauses satisfiable iff exactly half the symbols are true and half are false
+        count = self.dimension - int(self.dimension / 2)
+        if self.encoding == "sequential":
+            sequential_counter(self.backend, self.var_list, count)
+        elif self.encoding == "combinations":
+            combinations_counter(self.backend, self.var_list, count)
+        else:
+            raise ValueError("Unknown cardinality encoding: " + str(encoding))
+
+        # Clauses satisfiable if at most two neighbors have the same logical value
+        # expressed for neighboring triples
+        neighbor_clauses(self.backend, self.var_list)
 
     def assign_value(self, index, val):
         if val == '1':
-            self.full_formula = And([self.full_formula, self.var_list[index]])
+            self.backend.add_clause([self.var_list[index]])
         elif val == '0':
-            self.full_formula = And(
-                [self.full_formula, Not(self.var_list[index])])
+            self.backend.add_clause([-self.var_list[index]])
 
     def is_satisfiable(self):
         """
         Method
         :return True if the formula is satisfiable
         """
-        return is_sat(self.full_formula)
+        self.solver_calls += 1
+        return self.backend.solve()
+
+    def _model(self):
+        self.models += 1
+        return ['1' if self.backend.value(var) else '0' for var in self.var_list]
 
-    def get_all_solutions(self, base_formula):
+    def iter_solutions(self, max_solutions=None):
         """
-        Method
-        :return True if the formula has more than one solution
+        Method yields the models of the formula one at a time, each a list of '0'
+        and '1', blocking each model before looking for the next one. The blocking
+        clauses live in a frame that is popped when the enumeration ends or is closed.
+
+        :param max_solutions stops the enumeration after that many models
         """
-        if not is_sat(base_formula):
-            return []
+        found = 0
+        self.backend.push()
+        try:
+            while max_solutions is None or found < max_solutions:
+                self.solver_calls += 1
+                if not self.backend.solve():
+                    return
+                found += 1
+                yield self._model()
 
-        model = get_model(base_formula)
+                # Block the found solution to find the other solutions
+                self.backend.add_blocking_clause(self.var_list)
+        finally:
+            self.backend.pop()
 
-        # Block the found solution to find the other solutions
-        first_sol_blocker = Or([Not(Iff(var, model[var]))
-                               for var in self.var_list])
-        new_formula = And([base_formula, first_sol_blocker])
-        return [model] + self.get_all_solutions(new_formula)
+    def get_all_solutions(self):
+        """
+        Method
+        :return the list of all models of the formula
+        """
+        return list(self.iter_solutions())
 
     def get_solution(self):
         """
         Method
         for formulas with a unique solution returns the values
+
+        Instead of enumerating every model, which is hopeless for long lines, each
+        value of a first model is tested by asking for a model with the other value;
+        every model found that way also settles the cells where it differs.
         """
-        solutions = self.get_all_solutions(self.full_formula)
-
-        def get_common(var, sols):
-            if len(sols) == 0:
-                return '_'
-            first_sol = ('1' if sols[0][var] == Bool(True) else '0')
-            if len(sols) == 1:
-                return first_sol
-            elif len(sols) > 1:
-                if first_sol == get_common(var, sols[1:]):
-                    return first_sol
-                else:
-                    return '_'
-
-        partial_solution = []
-        # find common elements
-        for var in self.var_list:
-            partial_solution.append(get_common(var, solutions))
+        self.solver_calls += 1
+        if not self.backend.solve():
+            return ['_'] * self.dimension
+        partial_solution = self._model()
 
+        for j, var in enumerate(self.var_list):
+            if partial_solution[j] == '_':
+                continue
+            if self.environment is not None and self.environment[j] != '_':
+                continue
+            self.solver_calls += 1
+            if not self.backend.solve([-var if partial_solution[j] == '1' else var]):
+                continue
+            for k, value in enumerate(self._model()):
+                if partial_solution[k] != value:
+                    partial_solution[k] = '_'
         return partial_solution
 
-    def get_atoms(self):
-        return get_atoms(self.full_formula)
+    def size(self):
+        """
+        Method
+        :return the number of clauses of the formula
+        """
+        return self.backend.size()
 
     def fill_in(self, values):
         self.environment = values
@@ -118,6 +180,115 @@ class RowFormula:
             print("Array of values does not match dimension")
 
 
+# Incremental solvers are kept alive per (dimension, encoding, backend)
+_incremental_solvers = {}
+
+
+def get_incremental_solver(dimension, encoding="sequential", backend=DEFAULT_BACKEND):
+    """
+    Method returns the shared IncrementalRowSolver for lines of length dimension
+    """
+    key = (dimension, encoding, backend)
+    solver = _incremental_solvers.get(key)
+    if solver is None:
+        solver = IncrementalRowSolver(dimension, encoding, backend)
+        _incremental_solvers[key] = solver
+    return solver
+
+
+class IncrementalRowSolver:
+    '''One persistent backend holding the row constraints of a dimension'''
+
+    def __init__(self, dimension, encoding="sequential", backend=DEFAULT_BACKEND):
+        self.dimension = dimension
+        # The base row constraints are added only once
+        self.formula = RowFormula(dimension, encoding, backend)
+        self.var_list = self.formula.var_list
+        self.solver = self.formula.backend
+        # work done so far, read by the solver statistics
+        self.solver_calls = 0
+        self.models = 0
+
+    def _assumptions(self, values):
+        assumptions = []
+        for var, value in zip(self.var_list, values):
+            if value == '1':
+                assumptions.append(var)
+            elif value == '0':
+                assumptions.append(-var)
+        return assumptions
+
+    def is_satisfiable(self, values):
+        """
+        Method
+        :return True if the line can be completed given the known values
+        """
+        self.solver_calls += 1
+        return self.solver.solve(self._assumptions(values))
+
+    def iter_solutions(self, values, max_solutions=None):
+        """
+        Method yields the completions of a line one at a time, each a list of '0'
+        and '1'. The known values are passed as assumptions and blocking clauses
+        live in a frame that is popped when the enumeration ends or is closed.
+
+        :param max_solutions stops the enumeration after that many completions
+        """
+        assumptions = self._assumptions(values)
+        found = 0
+        self.solver.push()
+        try:
+            while max_solutions is None or found < max_solutions:
+                if not self._solve(assumptions):
+                    return
+                found += 1
+                yield self._model()
+                # Block the found solution to find the other solutions
+                self.solver.add_blocking_clause(self.var_list)
+        finally:
+            self.solver.pop()
+
+    def get_all_solutions(self, values):
+        """
+        Method
+        :return list of completions, each a list of '0' and '1'
+        """
+        return list(self.iter_solutions(values))
+
+    def get_solution(self, values):
+        """
+        Method
+        :return the values common to all completions, or None if there is none
+        """
+        if len(values) != self.dimension:
+            print("Array of values does not match dimension")
+            return None
+
+        assumptions = self._assumptions(values)
+        if not self._solve(assumptions):
+            return None
+        partial_solution = self._model()
+
+        # the same test as RowFormula.get_solution, with the other value of a cell
+        # passed as one more assumption
+        for j, var in enumerate(self.var_list):
+            if partial_solution[j] == '_' or values[j] in ('0', '1'):
+                continue
+            if not self._solve(assumptions + [-var if partial_solution[j] == '1' else var]):
+                continue
+            for k, value in enumerate(self._model()):
+                if partial_solution[k] != value:
+                    partial_solution[k] = '_'
+        return partial_solution
+
+    def _solve(self, assumptions):
+        self.solver_calls += 1
+        return self.solver.solve(assumptions)
+
+    def _model(self):
+        self.models += 1
+        return ['1' if self.solver.value(var) else '0' for var in self.var_list]
+
 if __name__ == "__main__":
     row = RowFormula(8)
     env = ['0', '1', '1', '0', '_', '1', '1', '0']
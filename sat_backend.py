@@ -0,0 +1,416 @@
+# Solver backends of the SAT encodings (RowFormula, IncrementalRowSolver and
+# BoardFormula)
+#
+# The encodings only talk to a backend: variables are positive integers and a
+# literal is a variable or its negation, as in DIMACS. A backend adds clauses,
+# solves under assumptions, reads the model and blocks it, and keeps clauses added
+# after push in a frame that pop removes again.
+#
+#   "cnf"    CNFBackend, a small CDCL solver in pure Python, no dependencies
+#   "pysmt"  PysmtBackend, the clauses as pysmt formulas in the default pysmt solver
+import heapq
+
+DEFAULT_BACKEND = "cnf"
+
+
+class Backend:
+    '''Interface of a solver backend, see the comment at the top of the module'''
+
+    def new_var(self, name=None):
+        """
+        Method
+        :return a new variable, name is only used by backends that show it
+        """
+        raise NotImplementedError
+
+    def add_clause(self, clause):
+        """
+        Method adds the disjunction of the literals in clause
+        """
+        raise NotImplementedError
+
+    def solve(self, assumptions=()):
+        """
+        Method
+        :return True if the clauses are satisfiable with all assumptions true
+        """
+        raise NotImplementedError
+
+    def value(self, var):
+        """
+        Method
+        :return the value of var in the model of the last successful solve
+        """
+        raise NotImplementedError
+
+    def push(self):
+        raise NotImplementedError
+
+    def pop(self):
+        raise NotImplementedError
+
+    def size(self):
+        """
+        Method
+        :return the number of clauses
+        """
+        raise NotImplementedError
+
+    def add_blocking_clause(self, variables):
+        """
+        Method excludes the values the last model gives to variables
+        """
+        self.add_clause([-var if self.value(var) else var for var in variables])
+
+
+class CNFBackend(Backend):
+    '''Conflict driven clause learning with two watched literals, activity based
+    decisions with saved phases and restarts, all in pure Python'''
+
+    def __init__(self):
+        self.num_vars = 0
+        # the clauses as added, the solver state is rebuilt from them now and then
+        self.original = []
+        # (selector, number of clauses before it) of every pushed frame: the clauses
+        # added in a frame hold the negated selector, solve assumes the selectors of
+        # all frames and pop sets the selector false for good, so learned clauses
+        # survive a pop
+        self.frames = []
+        # clauses of popped frames still in the solver, removed by the next rebuild,
+        # and the selectors of popped frames
+        self.garbage = 0
+        self.retired = []
+        self._reset()
+
+    def _reset(self):
+        # clauses in use, with the watched literals in the first two places,
+        # learned clauses are appended to the added ones
+        self.clauses = []
+        self.watches = {}
+        # per variable: 1, -1 or 0 if unassigned, decision level, reason clause
+        self.assign = [0] * (self.num_vars + 1)
+        self.level = [0] * (self.num_vars + 1)
+        self.reason = [None] * (self.num_vars + 1)
+        self.activity = [0.0] * (self.num_vars + 1)
+        self.phase = [-1] * (self.num_vars + 1)
+        self.var_inc = 1.0
+        self.order = [(0.0, var) for var in range(1, self.num_vars + 1)]
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        # set when the clauses are unsatisfiable without any assumption
+        self.unsat = False
+        self.model = None
+        for var in range(1, self.num_vars + 1):
+            self.watches[var] = []
+            self.watches[-var] = []
+
+    def new_var(self, name=None):
+        self.num_vars += 1
+        var = self.num_vars
+        for values in (self.assign, self.level, self.activity):
+            values.append(0)
+        self.activity[var] = 0.0
+        self.reason.append(None)
+        self.phase.append(-1)
+        heapq.heappush(self.order, (0.0, var))
+        self.watches[var] = []
+        self.watches[-var] = []
+        return var
+
+    def add_clause(self, clause):
+        clause = list(clause)
+        if self.frames:
+            clause.append(-self.frames[-1][0])
+        self.original.append(clause)
+        self._attach(list(clause))
+
+    def _attach(self, clause):
+        # called at decision level 0, between solves
+        if self.unsat:
+            return
+        clause = list(dict.fromkeys(clause))
+        if any(-literal in clause for literal in clause):
+            return
+        assign = self.assign
+        open_literals = []
+        for literal in clause:
+            value = assign[abs(literal)] if literal > 0 else -assign[abs(literal)]
+            if value > 0:
+                # satisfied for as long as the clause lives, a pop rebuilds anyway
+                return
+            if value == 0:
+                open_literals.append(literal)
+        if not open_literals:
+            self.unsat = True
+            return
+        cid = len(self.clauses)
+        if len(open_literals) == 1:
+            self.clauses.append([open_literals[0]])
+            self._assign(open_literals[0], cid)
+            if self._propagate() is not None:
+                self.unsat = True
+            return
+        # watch two literals that are not false, level 0 false ones never come back
+        clause = open_literals + [literal for literal in clause if literal not in open_literals]
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(cid)
+        self.watches[clause[1]].append(cid)
+
+    def push(self):
+        self.frames.append((self.new_var(), len(self.original)))
+
+    def pop(self):
+        selector, start = self.frames.pop()
+        self.garbage += len(self.original) - start
+        del self.original[start:]
+        self.retired.append(selector)
+        if self.garbage > max(1000, len(self.original)):
+            # the clauses of popped frames are satisfied but still watched
+            self.garbage = 0
+            self._reset()
+            for clause in self.original:
+                self._attach(list(clause))
+            for retired in self.retired:
+                self._attach([-retired])
+        else:
+            self._attach([-selector])
+
+    def size(self):
+        return len(self.original)
+
+    def value(self, var):
+        return self.model[var] > 0
+
+    def _assign(self, literal, reason):
+        var = abs(literal)
+        self.assign[var] = 1 if literal > 0 else -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(literal)
+
+    def _propagate(self):
+        """
+        Method propagates the assignments on the trail
+
+        :return the id of a conflicting clause, or None
+        """
+        assign = self.assign
+        clauses = self.clauses
+        watches = self.watches
+        trail = self.trail
+        while self.qhead < len(trail):
+            false_literal = -trail[self.qhead]
+            self.qhead += 1
+            watchers = watches[false_literal]
+            kept = []
+            for position, cid in enumerate(watchers):
+                clause = clauses[cid]
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], false_literal
+                first = clause[0]
+                first_value = assign[first] if first > 0 else -assign[-first]
+                if first_value > 0:
+                    kept.append(cid)
+                    continue
+                for index in range(2, len(clause)):
+                    literal = clause[index]
+                    if (assign[literal] if literal > 0 else -assign[-literal]) >= 0:
+                        clause[1], clause[index] = literal, false_literal
+                        watches[literal].append(cid)
+                        break
+                else:
+                    kept.append(cid)
+                    if first_value < 0:
+                        kept.extend(watchers[position + 1:])
+                        watches[false_literal] = kept
+                        self.qhead = len(trail)
+                        return cid
+                    self._assign(first, cid)
+            watches[false_literal] = kept
+        return None
+
+    def _analyze(self, conflict):
+        """
+        Method derives the first unique implication point clause of a conflict
+
+        :return (learned clause with the asserting literal first, backjump level)
+        """
+        seen = set()
+        learned = [None]
+        current = len(self.trail_lim)
+        counter = 0
+        literals = self.clauses[conflict]
+        index = len(self.trail) - 1
+        while True:
+            for literal in literals:
+                var = abs(literal)
+                if var not in seen and self.level[var] > 0:
+                    seen.add(var)
+                    self._bump(var)
+                    if self.level[var] == current:
+                        counter += 1
+                    else:
+                        learned.append(literal)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            implied = self.trail[index]
+            index -= 1
+            seen.discard(abs(implied))
+            counter -= 1
+            if counter == 0:
+                break
+            # the implied literal is the first of its reason clause
+            literals = self.clauses[self.reason[abs(implied)]][1:]
+        learned[0] = -implied
+
+        level = 0
+        if len(learned) > 1:
+            # the literal of the highest level is watched next to the asserting one
+            highest = max(range(1, len(learned)), key=lambda k: self.level[abs(learned[k])])
+            learned[1], learned[highest] = learned[highest], learned[1]
+            level = self.level[abs(learned[1])]
+        self.var_inc /= 0.95
+        return learned, level
+
+    def _bump(self, var):
+        self.activity[var] += self.var_inc
+        if self.activity[var] > 1e100:
+            for other in range(1, self.num_vars + 1):
+                self.activity[other] *= 1e-100
+            self.var_inc *= 1e-100
+            self.order = [(-self.activity[other], other) for other in range(1, self.num_vars + 1)
+                          if not self.assign[other]]
+            heapq.heapify(self.order)
+        elif not self.assign[var]:
+            heapq.heappush(self.order, (-self.activity[var], var))
+
+    def _backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        for literal in self.trail[self.trail_lim[level]:]:
+            var = abs(literal)
+            self.phase[var] = 1 if literal > 0 else -1
+            self.assign[var] = 0
+            self.reason[var] = None
+            heapq.heappush(self.order, (-self.activity[var], var))
+        del self.trail[self.trail_lim[level]:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def _decide(self):
+        # the unassigned variable of the highest activity, stale heap entries skipped
+        while self.order:
+            _, var = heapq.heappop(self.order)
+            if not self.assign[var]:
+                return var if self.phase[var] > 0 else -var
+        return None
+
+    def solve(self, assumptions=()):
+        self.model = None
+        if self.unsat:
+            return False
+        result = self._search([selector for selector, _ in self.frames] + list(assumptions))
+        self._backtrack(0)
+        return result
+
+    def _search(self, assumptions):
+        conflicts = 0
+        restart = 100
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                if not self.trail_lim:
+                    self.unsat = True
+                    return False
+                learned, level = self._analyze(conflict)
+                self._backtrack(level)
+                cid = len(self.clauses)
+                self.clauses.append(learned)
+                if len(learned) > 1:
+                    self.watches[learned[0]].append(cid)
+                    self.watches[learned[1]].append(cid)
+                self._assign(learned[0], cid)
+                conflicts += 1
+                if conflicts == restart:
+                    conflicts = 0
+                    restart = int(restart * 1.5)
+                    self._backtrack(0)
+                continue
+
+            level = len(self.trail_lim)
+            if level < len(assumptions):
+                literal = assumptions[level]
+                value = self.assign[abs(literal)] if literal > 0 else -self.assign[abs(literal)]
+                if value < 0:
+                    return False
+                # every assumption opens a level, even if it already holds
+                self.trail_lim.append(len(self.trail))
+                if value == 0:
+                    self._assign(literal, None)
+                continue
+
+            literal = self._decide()
+            if literal is None:
+                self.model = list(self.assign)
+                return True
+            self.trail_lim.append(len(self.trail))
+            self._assign(literal, None)
+
+
+class PysmtBackend(Backend):
+    '''The clauses as pysmt formulas, asserted in one persistent solver of the
+    default pysmt environment'''
+
+    def __init__(self):
+        from pysmt.shortcuts import Solver, Symbol, FreshSymbol, Or, Not
+        self._symbol = Symbol
+        self._fresh_symbol = FreshSymbol
+        self._or = Or
+        self._not = Not
+        self.solver = Solver()
+        self.symbols = [None]
+        self.clauses = 0
+        self.frames = []
+
+    def new_var(self, name=None):
+        self.symbols.append(self._fresh_symbol() if name is None else self._symbol(name))
+        return len(self.symbols) - 1
+
+    def _literal(self, literal):
+        symbol = self.symbols[abs(literal)]
+        return symbol if literal > 0 else self._not(symbol)
+
+    def add_clause(self, clause):
+        self.clauses += 1
+        self.solver.add_assertion(self._or([self._literal(literal) for literal in clause]))
+
+    def solve(self, assumptions=()):
+        return self.solver.solve([self._literal(literal) for literal in assumptions])
+
+    def value(self, var):
+        return bool(self.solver.get_py_value(self.symbols[var]))
+
+    def push(self):
+        self.frames.append(self.clauses)
+        self.solver.push()
+
+    def pop(self):
+        self.clauses = self.frames.pop()
+        self.solver.pop()
+
+    def size(self):
+        return self.clauses
+
+
+BACKENDS = {"cnf": CNFBackend, "pysmt": PysmtBackend}
+
+
+def get_backend(name=DEFAULT_BACKEND):
+    """
+    Method
+    :return a new backend of the given name, see BACKENDS
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown solver backend: " + str(name))
+    return BACKENDS[name]()
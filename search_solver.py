@@ -0,0 +1,258 @@
+import random
+
+from solver import Solver
+from line_table import get_line_table
+from bitboard import ROWS, COLS, EMPTY, popcount
+
+# backtracks before the first restart of a search
+DEFAULT_RESTART_LIMIT = 100
+
+
+class LinePropagator(Solver):
+    '''Worklist propagation like Solver, but every dirty line is completed with
+    all cells shared by its valid completions instead of the four rules'''
+
+    def solve_line(self, axis, k):
+        if self.stats is None:
+            self._deduce_line(axis, k)
+            return
+        known = self.board.known[axis][k]
+        start = self.stats.clock()
+        self._deduce_line(axis, k)
+        elapsed = self.stats.clock() - start
+        self.stats.record("line_table", popcount(self.board.known[axis][k] & ~known), elapsed)
+
+    def _deduce_line(self, axis, k):
+        known, ones = self.board.line(axis, k)
+        table = get_line_table(self.board.line_length(axis))
+        if self.cache is None:
+            deduction = table.deduce(known, ones)
+        else:
+            deduction = self.cache.lookup(("lines", table.dimension, known, ones),
+                                          lambda: table.deduce(known, ones))
+        if deduction is None:
+            self.contradiction = True
+            return
+        forced, forced_ones = deduction
+        self._put_line(axis, k, forced & ~known, forced_ones, "line_table")
+
+
+class SearchSolver:
+    '''Complete solver: backtracking search over undecided cells, with every
+    decision propagated through the rows and columns it touches'''
+
+    def __init__(self, board, branching="constrained", distinct_lines=True, seed=None,
+                 propagation="lines", stats=None, cache=None, backtrack_limit=None,
+                 restart_limit=DEFAULT_RESTART_LIMIT):
+        self.board = board
+        # optional SolverStats and LineCache, shared with the propagator
+        self.stats = stats
+        self.cache = cache
+        # "lines" propagates with the valid-line tables, "rules" with the
+        # heuristic Solver rules only
+        self.propagation = propagation
+        # "first" picks the first empty cell, "constrained" a cell in the fullest
+        # line and "random" any empty cell with a random first value, "first_random"
+        # the first empty cell with a random first value
+        self.branching = branching
+        # also enforce that no two rows and no two columns are equal
+        self.distinct_lines = distinct_lines
+        self.random = random.Random(seed)
+        # the search gives up after that many backtracks, limit_reached tells
+        # whether it did
+        self.backtrack_limit = backtrack_limit
+        self.limit_reached = False
+        # backtracks before the first restart, doubled on every restart, None never
+        # restarts; with restarts the first value of every decision is random
+        self.restart_limit = restart_limit
+        self.restarts = 0
+        self.is_board_updated = False
+
+    def update_callback(self, symbol, i, j):
+        self.is_board_updated = True
+
+    def choose_cell(self, work):
+        """
+        Method
+        :return the (row, column) of the next cell to decide and the value to try first
+        """
+        full_row = (1 << work.cols) - 1
+        empties = [(i, full_row & ~work.known[ROWS][i]) for i in range(work.rows)]
+        empties = [(i, empty) for i, empty in empties if empty]
+
+        if self.branching == "random":
+            i, empty = self.random.choice(empties)
+            positions = [j for j in range(work.cols) if (empty >> j) & 1]
+            return (i, self.random.choice(positions)), self.random.choice('01')
+
+        if self.branching == "constrained":
+            # the row with the fewest empty cells, and in it the empty cell
+            # whose column has the fewest empty cells
+            i, empty = min(empties, key=lambda item: popcount(item[1]))
+            full_col = (1 << work.rows) - 1
+            positions = [j for j in range(work.cols) if (empty >> j) & 1]
+            j = min(positions, key=lambda j: popcount(full_col & ~work.known[COLS][j]))
+            return (i, j), self._first_value()
+
+        i, empty = empties[0]
+        if self.branching == "first_random":
+            return (i, (empty & -empty).bit_length() - 1), self.random.choice('01')
+        return (i, (empty & -empty).bit_length() - 1), self._first_value()
+
+    def _first_value(self):
+        # a restart only leads somewhere else if the values are tried in another order
+        return '0' if self.restart_limit is None else self.random.choice('01')
+
+    def iter_solutions(self, max_solutions=None):
+        """
+        Method yields the solutions of the board one at a time, as BitBoards
+
+        A search that backtracks restart_limit times without finishing is started
+        again with another value order and twice the limit. Solutions found before a
+        restart are not yielded again, and the run that finishes within its limit
+        has seen every solution.
+
+        :param max_solutions stops the search after that many solutions
+        """
+        self.limit_reached = False
+        self.restarts = 0
+        found = set()
+        limit = self.restart_limit
+        backtracks = 0
+        while True:
+            run_limit = limit
+            if self.backtrack_limit is not None:
+                left = self.backtrack_limit - backtracks
+                run_limit = left if run_limit is None else min(run_limit, left)
+            for solution in self._search(run_limit):
+                masks = solution.to_masks()
+                if masks in found:
+                    continue
+                found.add(masks)
+                yield solution
+                if max_solutions is not None and len(found) >= max_solutions:
+                    return
+            backtracks += self._backtracks
+            if not self._run_limited:
+                return
+            if self.backtrack_limit is not None and backtracks >= self.backtrack_limit:
+                self.limit_reached = True
+                return
+            limit *= 2
+            self.restarts += 1
+            if self.stats is not None:
+                self.stats.count("search_restarts")
+
+    def _search(self, backtrack_limit):
+        """
+        Method yields the solutions of one run of the search, as BitBoards, and stops
+        after backtrack_limit backtracks, setting _run_limited
+
+        The search runs on a copy of the board: decisions and their consequences are
+        recorded on a trail and undone on backtracking, no recursion is involved.
+        """
+        work = self.board.copy()
+        if self.propagation == "rules":
+            propagator = Solver(work, self.stats, self.cache, self.distinct_lines)
+        else:
+            propagator = LinePropagator(work, self.stats, self.cache, self.distinct_lines)
+        work.add_callback(propagator.update_callback)
+        # cells filled since the search started, in order
+        trail = []
+        work.add_callback(lambda symbol, i, j: trail.append((i, j)))
+
+        # (trail length before the decision, row, column, value still to try)
+        alternatives = []
+        self._backtracks = 0
+        self._run_limited = False
+
+        propagator.enqueue_all()
+        consistent = propagator.propagate()
+        while True:
+            if consistent and not work.is_board_solved():
+                (i, j), value = self.choose_cell(work)
+                if self.stats is not None:
+                    self.stats.count("search_decisions")
+                alternatives.append((len(trail), i, j, '1' if value == '0' else '0'))
+                work.put(value, i, j)
+                consistent = propagator.propagate()
+                continue
+
+            if consistent:
+                yield work.copy()
+
+            # backtrack to the most recent decision with a value left to try
+            if not alternatives:
+                return
+            if self._backtracks == backtrack_limit:
+                self._run_limited = True
+                return
+            self._backtracks += 1
+            mark, i, j, value = alternatives.pop()
+            if self.stats is not None:
+                self.stats.count("search_backtracks")
+            while len(trail) > mark:
+                cell = trail.pop()
+                work.put(EMPTY, cell[0], cell[1])
+            propagator.clear_worklist()
+            work.put(value, i, j)
+            consistent = propagator.propagate()
+
+    def count_solutions(self, limit=2):
+        """
+        Method
+        :return the number of solutions, counting stops at limit
+        """
+        return sum(1 for _ in self.iter_solutions(limit))
+
+    def forced_cells(self):
+        """
+        Method finds the cells shared by every solution, keeping only the running
+        intersection as masks and stopping once no empty cell is shared
+
+        :return a BitBoard holding the shared cells, or None if there is no solution
+        """
+        common = None
+        solutions = self.iter_solutions()
+        try:
+            for solution in solutions:
+                if common is None:
+                    common = solution
+                    continue
+                shared = 0
+                for i in range(common.rows):
+                    # keep the cells where both solutions hold the same symbol
+                    same = common.known[ROWS][i] & ~(common.ones[ROWS][i] ^ solution.ones[ROWS][i])
+                    for j in range(common.cols):
+                        if (common.known[ROWS][i] >> j) & 1 and not (same >> j) & 1:
+                            common.put(EMPTY, i, j)
+                    shared |= same & ~self.board.known[ROWS][i]
+                if not shared:
+                    break
+        finally:
+            solutions.close()
+        return common
+
+    def solve(self):
+        """
+        Method fills in the board if it has exactly one solution
+
+        :return "" on success, otherwise the reason the puzzle cannot be solved
+        """
+        self.is_board_updated = False
+        solutions = list(self.iter_solutions(2))
+        if not solutions:
+            print("Board has no solution!!!\n")
+            return "not satisfiable!"
+        elif len(solutions) > 1:
+            print("Board has multiple solutions!!!\n")
+            return "multiple solutions possible!"
+
+        solution = solutions[0]
+        self.board.cause = ("search", self.board.known_lines())
+        for i in range(self.board.rows):
+            for j in range(self.board.cols):
+                if self.board.get(i, j) == EMPTY:
+                    self.board.put(solution.get(i, j), i, j)
+        print("Unique solution found!!!")
+        return ""
@@ -0,0 +1,459 @@
+# Local solving service: a small HTTP server on the loopback interface that hands
+# the puzzles it receives to a warm pool of solver processes
+#
+#   POST /solve         body: a puzzle line as read by batch.py, or a JSON object
+#                       {"puzzle": ..., "search": false, "stats": false,
+#                        "probe_budget": probes, "timeout": seconds, "id": name}
+#                       answers with the JSON result of batch.solve_puzzle
+#   DELETE /solve/<id>  cancels the pending request sent with that id
+#   GET /status         counters of the service
+#
+# Requests wait in a bounded queue; when it is full they are refused with 503.
+# Every free worker takes all queued requests at once (up to --batch-size), so
+# under load the requests are coalesced into batches while a lone request is
+# sent on immediately. The requests of a batch go to the worker one at a time
+# and each is answered as soon as its puzzle is solved. A request that times
+# out, is cancelled or whose client disconnects is skipped if its puzzle has not
+# started yet; if the worker is solving it, the worker is killed and a fresh one
+# takes over the rest of the batch, so an abandoned hard puzzle does not keep a
+# worker busy.
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+
+from batch import parse_puzzle, solve_puzzle, warm_worker
+from line_cache import DEFAULT_SIZE
+from solution_cache import DEFAULT_SOLUTIONS
+from probing import DEFAULT_BUDGET
+
+# largest request body accepted, in bytes
+MAX_BODY = 1 << 16
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+def _work(connection, warm, line_cache, solution_cache):
+    # entry point of a worker process: receives batch.solve_puzzle jobs one at a
+    # time and sends back (True, result) or (False, error) for each
+    warm_worker(warm, line_cache, None, solution_cache)
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        try:
+            answer = (True, solve_puzzle(job))
+        except Exception as error:
+            answer = (False, error)
+        connection.send(answer)
+
+
+class HTTPError(Exception):
+    '''Request that is answered with an error status'''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class Request:
+    '''A puzzle waiting in the queue of the service'''
+
+    def __init__(self, index, puzzle, search, stats, probe_budget, future):
+        self.index = index
+        self.puzzle = puzzle
+        self.search = search
+        self.stats = stats
+        self.probe_budget = probe_budget
+        self.future = future
+
+    def job(self):
+        return (self.index, self.puzzle, self.search, self.stats, self.probe_budget)
+
+
+class Worker:
+    '''A solver process of the service and the pipe to it'''
+
+    def __init__(self, warm, line_cache, solution_cache):
+        self.connection, child = multiprocessing.Pipe()
+        # every worker builds its line tables as it starts
+        self.process = multiprocessing.Process(
+            target=_work, args=(child, warm, line_cache, solution_cache), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+class SolvingService:
+    '''Queues puzzles, dispatches them in batches to a process pool and answers
+    the HTTP requests that sent them'''
+
+    def __init__(self, processes=None, batch_size=16, queue_size=256, timeout=30.0,
+                 warm=(6, 8, 10, 12, 14), line_cache=DEFAULT_SIZE,
+                 probe_budget=DEFAULT_BUDGET, solution_cache=DEFAULT_SOLUTIONS):
+        self.processes = processes or os.cpu_count()
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        # default seconds a request may take, from queueing to its result
+        self.timeout = timeout
+        self.warm = list(warm)
+        self.line_cache = line_cache
+        # default probes per puzzle, see probing.py
+        self.probe_budget = probe_budget
+        # solved puzzles each worker keeps, see solution_cache.py
+        self.solution_cache = solution_cache
+
+        self.workers = []
+        self.queue = None
+        # workers without a batch
+        self.idle = None
+        self.dispatcher = None
+        # one thread per worker waits for its answers
+        self.readers = None
+        # tasks that run a batch on a worker
+        self.running = set()
+        # requests sent with an id, by id
+        self.named = {}
+        self.counters = {"requests": 0, "solved": 0, "rejected": 0, "timeouts": 0,
+                         "cancelled": 0, "batches": 0, "running": 0, "restarts": 0}
+
+    def _new_worker(self):
+        worker = Worker(self.warm, self.line_cache, self.solution_cache)
+        self.workers.append(worker)
+        return worker
+
+    async def start(self):
+        """
+        Method starts the worker processes and the dispatcher
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        # one batch per worker at a time, the others wait in the queue
+        self.idle = asyncio.Queue()
+        self.readers = concurrent.futures.ThreadPoolExecutor(self.processes)
+        for _ in range(self.processes):
+            self.idle.put_nowait(self._new_worker())
+        self.dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self):
+        for task in [self.dispatcher] + list(self.running):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        while self.queue is not None and not self.queue.empty():
+            self.queue.get_nowait().future.cancel()
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+        if self.readers is not None:
+            self.readers.shutdown()
+
+    async def solve(self, puzzle, search=False, stats=False, timeout=None, probe_budget=None):
+        """
+        Method queues one puzzle and waits for its result
+
+        :return the result of batch.solve_puzzle as a dict
+        :raise asyncio.QueueFull if the queue is full, asyncio.TimeoutError if the
+               result did not arrive within timeout seconds
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.counters["requests"] += 1
+        if probe_budget is None:
+            probe_budget = self.probe_budget
+        request = Request(self.counters["requests"], puzzle, search, stats, probe_budget,
+                          future)
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise
+        # cancelling the wait, on timeout or from outside, cancels the future too
+        # and the dispatcher then skips the request
+        return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+
+    async def _dispatch(self):
+        while True:
+            worker = await self.idle.get()
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                self.idle.put_nowait(worker)
+                continue
+            task = asyncio.ensure_future(self._run(worker, batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _replace(self, worker, receiving):
+        # kill worker, which ends the wait for its answer, and start a new one
+        self.counters["restarts"] += 1
+        worker.process.terminate()
+        try:
+            # the pipe is closed only once the thread reading it is done
+            await asyncio.wait({receiving})
+        finally:
+            # the answer, or the end of the pipe, is of no use any more
+            if not receiving.done():
+                receiving.cancel()
+            elif not receiving.cancelled():
+                receiving.exception()
+        worker.stop()
+        self.workers.remove(worker)
+        return self._new_worker()
+
+    async def _run(self, worker, batch):
+        # sends the jobs of batch to worker one at a time and answers each request
+        loop = asyncio.get_running_loop()
+        self.counters["batches"] += 1
+        self.counters["running"] += 1
+        receiving = None
+        try:
+            for request in batch:
+                if request.future.done():
+                    # dropped while it waited, it is never sent
+                    continue
+                worker.connection.send(request.job())
+                receiving = loop.run_in_executor(self.readers, worker.connection.recv)
+                await asyncio.wait({receiving, request.future},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                answer, receiving = receiving, None
+                if not answer.done():
+                    # dropped while being solved, a new worker takes the rest
+                    worker = await self._replace(worker, answer)
+                    continue
+                try:
+                    succeeded, value = answer.result()
+                except (EOFError, OSError) as error:
+                    # the worker died, the request that killed it fails
+                    _set_exception(request.future, error)
+                    worker = await self._replace(worker, answer)
+                    continue
+                if succeeded:
+                    _set_result(request.future, value)
+                else:
+                    _set_exception(request.future, value)
+        finally:
+            if receiving is not None:
+                # stopped while waiting, stop kills the worker and its answer is
+                # of no use
+                receiving.cancel()
+            self.counters["running"] -= 1
+            self.idle.put_nowait(worker)
+
+    def cancel(self, name):
+        """
+        Method cancels the pending request sent with id name
+
+        :return False if there is no such request
+        """
+        task = self.named.get(name)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def status(self):
+        result = dict(self.counters)
+        result.update(queued=self.queue.qsize(), processes=self.processes,
+                      batch_size=self.batch_size, queue_size=self.queue_size)
+        return result
+
+    async def handle(self, reader, writer):
+        """
+        Method answers one HTTP request, the connection is closed afterwards
+        """
+        try:
+            status, body = await self._handle(reader)
+        except HTTPError as error:
+            status, body = error.status, {"error": str(error)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            status, body = None, None
+        except Exception as error:
+            status, body = 500, {"error": str(error)}
+
+        try:
+            if status is not None:
+                payload = json.dumps(body).encode()
+                header = ("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n"
+                          "Content-Length: {}\r\nConnection: close\r\n\r\n").format(
+                    status, REASONS[status], len(payload))
+                writer.write(header.encode("latin-1") + payload)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise HTTPError(400, "malformed request line")
+        method, path = request_line[0], request_line[1]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, path, body
+
+    async def _handle(self, reader):
+        # a client gets a few seconds to send its request
+        method, path, body = await asyncio.wait_for(self._read_request(reader), 10)
+
+        if path == "/status":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            return 200, self.status()
+        if path.startswith("/solve/"):
+            if method != "DELETE":
+                raise HTTPError(405, "use DELETE")
+            if not self.cancel(path[len("/solve/"):]):
+                raise HTTPError(404, "no pending request with this id")
+            return 200, {"cancelled": True}
+        if path != "/solve":
+            raise HTTPError(404, "unknown path")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+
+        options = self._parse_options(body)
+        return await self._solve_request(reader, options)
+
+    def _parse_options(self, body):
+        text = body.decode("utf-8", "replace").strip()
+        if text.startswith("{"):
+            try:
+                options = json.loads(text)
+            except ValueError:
+                raise HTTPError(400, "malformed JSON")
+            if not isinstance(options, dict):
+                raise HTTPError(400, "expected a JSON object")
+        else:
+            options = {"puzzle": text}
+
+        puzzle = options.get("puzzle")
+        if not isinstance(puzzle, str) or parse_puzzle(puzzle) is None:
+            raise HTTPError(400, "not a puzzle")
+        timeout = options.get("timeout")
+        if timeout is not None and not (isinstance(timeout, (int, float)) and timeout > 0):
+            raise HTTPError(400, "timeout must be a positive number of seconds")
+        probe_budget = options.get("probe_budget")
+        if probe_budget is not None and not (isinstance(probe_budget, int) and probe_budget >= 0):
+            raise HTTPError(400, "probe_budget must be a number of probes")
+        return options
+
+    async def _solve_request(self, reader, options):
+        name = options.get("id")
+        solving = asyncio.ensure_future(self.solve(
+            options["puzzle"], bool(options.get("search")), bool(options.get("stats")),
+            options.get("timeout"), options.get("probe_budget")))
+        if name is not None:
+            self.named[str(name)] = solving
+
+        # the client sends nothing more, an end of stream means it has gone away
+        watching = asyncio.ensure_future(reader.read(1))
+        try:
+            while not solving.done():
+                await asyncio.wait({solving, watching}, return_when=asyncio.FIRST_COMPLETED)
+                if watching.done() and not solving.done():
+                    if watching.result() == b"":
+                        solving.cancel()
+                        self.counters["cancelled"] += 1
+                        raise ConnectionError("client disconnected")
+                    watching = asyncio.ensure_future(reader.read(1))
+            try:
+                result = solving.result()
+            except asyncio.QueueFull:
+                raise HTTPError(503, "too many pending requests")
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                raise HTTPError(504, "no result within the timeout")
+            except asyncio.CancelledError:
+                self.counters["cancelled"] += 1
+                raise HTTPError(409, "request cancelled")
+        finally:
+            watching.cancel()
+            if name is not None and self.named.get(str(name)) is solving:
+                del self.named[str(name)]
+
+        self.counters["solved"] += 1
+        return 200, result
+
+
+async def serve(service, host, port):
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print("Solving service listening on http://{}:{}".format(host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the binary puzzle solvers over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="most requests sent to a worker at a time")
+    parser.add_argument("--queue-size", type=int, default=256,
+                        help="pending requests before new ones are refused")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="default seconds until a request is answered with 504")
+    parser.add_argument("--warm", type=int, nargs="*", default=[6, 8, 10, 12, 14],
+                        help="line lengths whose tables each worker builds at start")
+    parser.add_argument("--line-cache", type=int, default=DEFAULT_SIZE,
+                        help="lines whose deductions each worker keeps (0 disables)")
+    parser.add_argument("--probe-budget", type=int, default=DEFAULT_BUDGET,
+                        help="default probes per puzzle before the line solver takes over "
+                             "(0 skips probing)")
+    parser.add_argument("--solution-cache", type=int, default=DEFAULT_SOLUTIONS,
+                        help="solved puzzles each worker keeps, shared by their mirrored, "
+                             "rotated and 0/1 swapped copies (0 disables)")
+    args = parser.parse_args(argv)
+
+    service = SolvingService(args.processes, args.batch_size, args.queue_size,
+                             args.timeout, args.warm, args.line_cache, args.probe_budget,
+                             args.solution_cache)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
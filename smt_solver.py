@@ -1,27 +1,113 @@
 
-from board import Board
-from row_formula import RowFormula
-from cube import EMPTY
+from line_table import get_line_table, line_to_masks, masks_to_line
+from bitboard import ROWS, COLS, EMPTY, mask_bits, popcount
+from sat_backend import DEFAULT_BACKEND
+
+# The SAT encodings are imported only by the engines using them, with the "pysmt"
+# backend they pull in pysmt
 
 class SMT_Solver:
-    def __init__(self, board):
+    def __init__(self, board, line_engine="table", encoding="sequential", stats=None,
+                 cache=None, backend=DEFAULT_BACKEND):
         # build the board out of zeros and ones
         self.board = board
         self.is_board_updated = False
+        # "table" filters precomputed valid lines, "smt" builds a RowFormula per line,
+        # "incremental" reuses one SMT solver per dimension
+        self.line_engine = line_engine
+        # cardinality encoding of the "smt" engine, see RowFormula
+        self.encoding = encoding
+        # solver backend of the SAT encodings, see sat_backend.py
+        self.backend = backend
+        # whole board encodings, built on first use
+        self.board_formulas = {}
+        # optional SolverStats, and the SMT work done for the current line
+        self.stats = stats
+        self.line_work = [0, 0, 0]
+        # optional LineCache, every engine makes the same deductions on a line
+        self.cache = cache
 
     def update_callback(self, symbol, i, j):
         self.is_board_updated = True
 
-    def solve_rows(self):
-        for i in range(self.board.rows):
-            row_formula = RowFormula(self.board.rows)
-            row_formula.fill_in(self.board.board[i])
-            if row_formula.is_satisfiable():
-                solution = row_formula.get_solution()
-                if self.board.board[i] != solution:
-                    for j in range(self.board.cols):
-                        if self.board.board[i][j] == EMPTY and solution[j] != EMPTY:
-                            self.board.put(solution[j], i, j)
+    def solve_line(self, values):
+        """
+        Method finds the cells shared by all valid completions of a line
+
+        :return the partial solution, or None if the line is not satisfiable
+        """
+        if self.line_engine == "table":
+            return get_line_table(len(values)).solve_line(values)
+        if self.line_engine == "incremental":
+            from row_formula import get_incremental_solver
+            solver = get_incremental_solver(len(values), self.encoding, self.backend)
+            if self.stats is None:
+                return solver.get_solution(values)
+            calls, models = solver.solver_calls, solver.models
+            solution = solver.get_solution(values)
+            self._add_line_work(solver.solver_calls - calls, solver.models - models, 0)
+            return solution
+
+        from row_formula import RowFormula
+        row_formula = RowFormula(len(values), self.encoding, self.backend)
+        row_formula.fill_in(values)
+        solution = None
+        if row_formula.is_satisfiable():
+            solution = row_formula.get_solution()
+        if self.stats is not None:
+            self._add_line_work(row_formula.solver_calls, row_formula.models,
+                                row_formula.size())
+        return solution
+
+    def _add_line_work(self, smt_calls, models, formula_size):
+        self.line_work[0] += smt_calls
+        self.line_work[1] += models
+        self.line_work[2] += formula_size
+
+    def solve_line_masks(self, length, known, ones):
+        """
+        Method solve_line on a line given as bitmasks
+
+        :return (forced, forced_ones) masks, or None if the line is not satisfiable
+        """
+        if self.cache is not None:
+            return self.cache.lookup(("lines", length, known, ones),
+                                     lambda: self._solve_line_masks(length, known, ones))
+        return self._solve_line_masks(length, known, ones)
+
+    def _solve_line_masks(self, length, known, ones):
+        if self.line_engine == "table":
+            return get_line_table(length).deduce(known, ones)
+
+        solution = self.solve_line(masks_to_line(length, known, ones))
+        if solution is None:
+            return None
+        return line_to_masks(solution)
+
+    def solve_rows(self, axis=ROWS):
+        length = self.board.line_length(axis)
+        for k in range(self.board.line_count(axis)):
+            known, ones = self.board.line(axis, k)
+            if self.stats is None:
+                solution = self.solve_line_masks(length, known, ones)
+            else:
+                self.line_work = [0, 0, 0]
+                start = self.stats.clock()
+                solution = self.solve_line_masks(length, known, ones)
+                elapsed = self.stats.clock() - start
+                cells = 0 if solution is None else popcount(solution[0] & ~known)
+                self.stats.record("smt_rows" if axis == ROWS else "smt_columns",
+                                  cells, elapsed, *self.line_work)
+            if solution is not None:
+                forced, forced_ones = solution
+                self.board.cause = ("smt_rows" if axis == ROWS else "smt_columns",
+                                    ((axis, k, known),))
+                for position in mask_bits(forced & ~known):
+                    symbol = '1' if (forced_ones >> position) & 1 else '0'
+                    if axis == ROWS:
+                        self.board.put(symbol, k, position)
+                    else:
+                        self.board.put(symbol, position, k)
             else:
                 # Not satisfiable!
                 return False
@@ -31,22 +117,13 @@ class SMT_Solver:
 
         self.is_board_updated = False
 
-        # solve one of the items, by applying a row rule
-        result = self.solve_rows()
+        # solve one of the items, by applying a row rule on the rows and then
+        # on the columns, both read from the board masks without transposing
+        for axis in (ROWS, COLS):
+            result = self.solve_rows(axis)
 
-        if not result:
-            return "not satisfiable!"
-
-        # solve transposed matrix by applying same row rule
-        self.board.transpose()
-
-        result = self.solve_rows()
-
-        if not result:
-            return "not satisfiable!"
-
-        # transpose result
-        self.board.transpose()
+            if not result:
+                return "not satisfiable!"
 
         # recurse ...
         if first_call and not self.is_board_updated:
@@ -63,3 +140,33 @@ class SMT_Solver:
     
     def solve(self):
         return self._solve(first_call=True)
+
+    def solve_board(self):
+        """
+        Method decides with a whole board encoding whether the puzzle has zero, one
+        or more solutions, and fills in the solution if it is unique. Unlike the
+        line by line search this also enforces that no two rows or columns are equal.
+        """
+        key = (self.board.rows, self.board.cols)
+        if key not in self.board_formulas:
+            from board_formula import BoardFormula
+            self.board_formulas[key] = BoardFormula(self.board.rows, self.board.cols,
+                                                    self.backend)
+        board_formula = self.board_formulas[key]
+
+        number_of_solutions = board_formula.count_solutions(self.board.board, 2)
+        if number_of_solutions == 0:
+            print("Board has no solution!!!\n")
+            return "not satisfiable!"
+        elif number_of_solutions > 1:
+            print("Board has multiple solutions!!!\n")
+            return "multiple solutions possible!"
+
+        solution = board_formula.get_solution()
+        self.board.cause = ("smt_board", self.board.known_lines())
+        for i in range(self.board.rows):
+            for j in range(self.board.cols):
+                if self.board.get(i, j) == EMPTY:
+                    self.board.put(solution[i][j], i, j)
+        print("Unique solution found!!!")
+        return ""
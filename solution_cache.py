@@ -0,0 +1,57 @@
+# Bounded cache of solved puzzles, shared by all symmetric copies of a puzzle
+#
+# A key is the canonical form of the givens (see symmetry.py), so a puzzle and its
+# mirrored, rotated, transposed or 0/1 swapped copies share one entry. The value
+# is the result in the canonical orientation: (status, stage, multiple_solutions,
+# known, ones) with the whole-board masks of the board the solvers left. A hit is
+# mapped back through the inverse transform onto the puzzle as it was given.
+from bitboard import BitBoard, ROWS, mask_bits
+from line_cache import LineCache
+from symmetry import canonical_form, inverse, transform_board, transform_masks
+
+# number of puzzles kept by default
+DEFAULT_SOLUTIONS = 10000
+
+
+class SolutionCache(LineCache):
+    '''Least recently used mapping from canonical puzzles to their results, with the
+    counters and the persistence of LineCache'''
+
+    contents = "solutions"
+
+    def _encode(self, key, value):
+        return list(key) + list(value)
+
+    def _decode(self, entry):
+        return tuple(entry[:4]), tuple(entry[4:])
+
+    def lookup_board(self, board):
+        """
+        Method fills in the cells of the cached result of board, if there is one
+
+        :return (result, key, transform): the result as a dict with the status, the
+                stage and whether more than one solution is possible, or None on a
+                miss, and the canonical key and transform of board for store
+        """
+        key, transform = canonical_form(board)
+        try:
+            status, stage, multiple_solutions, known, ones = self[key]
+        except KeyError:
+            return None, key, transform
+        rows, cols = key[:2]
+        answer = transform_board(BitBoard.from_masks(rows, cols, known, ones),
+                                 inverse(transform))
+        for i in range(board.rows):
+            for j in mask_bits(answer.known[ROWS][i] & ~board.known[ROWS][i]):
+                board.put(answer.get(i, j), i, j)
+        return {"status": status, "stage": stage,
+                "multiple_solutions": multiple_solutions}, key, transform
+
+    def store(self, key, transform, result, board):
+        """
+        Method caches result and the cells of board, the puzzle solved, under the
+        key and transform lookup_board gave for the puzzle
+        """
+        known, ones = transform_masks(board, transform)[2:]
+        self[key] = (result["status"], result["stage"], result["multiple_solutions"],
+                     known, ones)
@@ -1,132 +1,334 @@
 
-from board import Board
-from cube import EMPTY
+from collections import deque
+
+from bitboard import ROWS, COLS, popcount, mask_bits
 
 class Solver:
-    def __init__(self, board):
+    def __init__(self, board, stats=None, cache=None, distinct_lines=True):
         # build the board out of zeros and ones
         self.board = board
         self.is_board_updated = False
+        # optional SolverStats, None keeps the rules free of any measurement
+        self.stats = stats
+        # optional LineCache, replays the deductions of lines seen before
+        self.cache = cache
+        # also use that no two rows and no two columns may be equal
+        self.distinct_lines = distinct_lines
+        # lines (axis, index) whose cells changed since the rules last ran on them
+        self.worklist = deque()
+        self.queued = set()
+        # axes on which a line was completed since solve_distinct last ran on
+        # their other lines
+        self.completed_axes = set()
+        # set when a line can no longer be completed
+        self.contradiction = False
 
     def update_callback(self, symbol, i, j):
         self.is_board_updated = True
+        # only the row and the column of the new cell can yield new deductions
+        self.enqueue(ROWS, i)
+        self.enqueue(COLS, j)
+        if self.distinct_lines:
+            # a line about to be completed can rule out completions of the other
+            # lines of its axis, the cell is stored after the callbacks
+            if self.board.known[ROWS][i] | (1 << j) == (1 << self.board.cols) - 1:
+                self.completed_axes.add(ROWS)
+            if self.board.known[COLS][j] | (1 << i) == (1 << self.board.rows) - 1:
+                self.completed_axes.add(COLS)
+
+    def enqueue(self, axis, k):
+        if (axis, k) not in self.queued:
+            self.queued.add((axis, k))
+            self.worklist.append((axis, k))
+
+    def enqueue_all(self):
+        for axis in (ROWS, COLS):
+            for k in range(self.board.line_count(axis)):
+                self.enqueue(axis, k)
+
+    def _lines(self, axis, line):
+        if line is None:
+            return range(self.board.line_count(axis))
+        return (line,)
+
+    def _put_mask(self, symbol, axis, k, mask, rule, antecedents=None):
+        # put symbol in every cell of line k whose bit is set in mask, deduced by
+        # rule from the filled cells of the line unless antecedents says otherwise
+        if not mask:
+            return
+        self.board.cause = (rule, antecedents or ((axis, k, self.board.known[axis][k]),))
+        for position in mask_bits(mask):
+            if axis == ROWS:
+                self.board.put(symbol, k, position)
+            else:
+                self.board.put(symbol, position, k)
+
+    def _put_line(self, axis, k, mask, ones, rule, antecedents=None):
+        # fill the cells of mask in line k with the symbols given by ones
+        self._put_mask('1', axis, k, mask & ones, rule, antecedents)
+        self._put_mask('0', axis, k, mask & ~ones, rule, antecedents)
 
-    def solve_adjacent(self):
+    def solve_adjacent(self, axis=ROWS, line=None):
         """
         Method for every quadruple '_ 1 1 _' and '_ 0 0 _' fills the empty places with
         '0' and '1' respectively
         """
-        for i in range(self.board.rows):
-            for j in range(self.board.cols - 1):
-                if self.board.board[i][j] == self.board.board[i][j + 1]:
-                    if self.board.board[i][j] == '1':
-                        self.board.put('0', i, j - 1)
-                        self.board.put('0', i, j + 2)
-                    elif self.board.board[i][j] == '0':
-                        self.board.put('1', i, j - 1)
-                        self.board.put('1', i, j + 2)
+        full = (1 << self.board.line_length(axis)) - 1
+        for k in self._lines(axis, line):
+            known, ones = self.board.line(axis, k)
+            zeros = known & ~ones
+            # bit j is set when cells j and j + 1 hold the same symbol
+            one_pairs = ones & (ones >> 1)
+            zero_pairs = zeros & (zeros >> 1)
+            zeros_next = ((one_pairs >> 1) | (one_pairs << 2)) & full & ~known
+            ones_next = ((zero_pairs >> 1) | (zero_pairs << 2)) & full & ~known
+            self._put_mask('0', axis, k, zeros_next, "solve_adjacent")
+            self._put_mask('1', axis, k, ones_next, "solve_adjacent")
 
-    def solve_empty_middle(self):
+    def solve_empty_middle(self, axis=ROWS, line=None):
         """
         Solve every triple in a row: '1 _ 1' and '0 _ 0' by filling with 0 and 1 respectively
         """
-        for i in range(self.board.rows):
-            for j in range(self.board.cols - 2):
-                if self.board.board[i][j] == self.board.board[i][j + 2]:
-                    if self.board.board[i][j] == '1':
-                        self.board.put('0', i, j + 1)
-                    elif self.board.board[i][j] == '0':
-                        self.board.put('1', i, j + 1)
+        for k in self._lines(axis, line):
+            known, ones = self.board.line(axis, k)
+            zeros = known & ~ones
+            # bit j is set when cells j and j + 2 hold the same symbol
+            one_gaps = ones & (ones >> 2)
+            zero_gaps = zeros & (zeros >> 2)
+            self._put_mask('0', axis, k, (one_gaps << 1) & ~known, "solve_empty_middle")
+            self._put_mask('1', axis, k, (zero_gaps << 1) & ~known, "solve_empty_middle")
 
-    def solve_one_remaining(self):
+    def solve_one_remaining(self, axis=ROWS, line=None):
         """
         Method find all rows which have only one place unfilled and solve the remaining one
         """
-
-        for i in range(self.board.rows):
-            number_of_empties = 0
-            number_of_ones = 0
-            number_of_zeros = 0
-            location_of_empty = (0, 0)
-            # find the only empty one
-            for j in range(self.board.cols):
-                if self.board.board[i][j] == EMPTY:
-                    if number_of_empties == 0:
-                        number_of_empties = 1
-                        location_of_empty = (i, j)
-                    else:
-                        number_of_empties = 2
-                        break
-                elif self.board.board[i][j] == '0':
-                    number_of_zeros += 1
-                else:
-                    number_of_ones += 1
-
+        length = self.board.line_length(axis)
+        full = (1 << length) - 1
+        for k in self._lines(axis, line):
+            known, ones = self.board.line(axis, k)
+            empty = full & ~known
             # fill the empty place
-            if number_of_empties == 1:
+            if empty and not empty & (empty - 1):
+                number_of_ones = popcount(ones)
+                number_of_zeros = length - 1 - number_of_ones
                 if number_of_zeros > number_of_ones:
-                    self.board.put('1', location_of_empty[0], location_of_empty[1])
+                    self._put_mask('1', axis, k, empty, "solve_one_remaining")
                 else:
-                    self.board.put('0', location_of_empty[0], location_of_empty[1])
+                    self._put_mask('0', axis, k, empty, "solve_one_remaining")
 
-    def solve_half_full(self):
+    def solve_half_full(self, axis=ROWS, line=None):
         """
         Method which solves the board whenever all possible instances of either 1 or 0 
         are already placed (by filling the rest with 0 or 1 respectively)
         """
-        max_number_of_a_symbol = self.board.rows / 2
-
-        for i in range(self.board.rows):
-            zeros = 0
-            ones = 0
-            for j in range(self.board.cols):
-                if self.board.board[i][j] == '0':
-                    zeros += 1
-                elif self.board.board[i][j] == '1':
-                    ones += 1
-            if zeros == max_number_of_a_symbol:
-                for j in range(self.board.cols):
-                    if self.board.board[i][j] == EMPTY:
-                        self.put('1', i, j)
-            if ones == max_number_of_a_symbol:
-                for j in range(self.board.cols):
-                    if self.board.board[i][j] == EMPTY:
-                        self.board.put('0', i, j)
-
-    # Returns False if absolutely no progress was made on the first call
-    def _solve(self, first_call=False):
+        length = self.board.line_length(axis)
+        max_number_of_a_symbol = length / 2
+        full = (1 << length) - 1
 
-        self.is_board_updated = False
+        for k in self._lines(axis, line):
+            known, ones = self.board.line(axis, k)
+            empty = full & ~known
+            if not empty:
+                continue
+            if popcount(known & ~ones) == max_number_of_a_symbol:
+                self._put_mask('1', axis, k, empty, "solve_half_full")
+            elif popcount(ones) == max_number_of_a_symbol:
+                self._put_mask('0', axis, k, empty, "solve_half_full")
 
-        # solve one of the items, by applying a row rule
-        self.solve_adjacent()
-        self.solve_empty_middle()
-        self.solve_one_remaining()
-        self.solve_half_full()
+    def solve_distinct(self, axis=ROWS, line=None):
+        """
+        Method for every line with two empty places, one of which takes a '1',
+        fills them such that the line does not equal a completed line of the same
+        axis, looked up in the index kept by the board
+        """
+        if not self.board.completed[axis]:
+            return
+        length = self.board.line_length(axis)
+        full = (1 << length) - 1
+        for k in self._lines(axis, line):
+            known, ones = self.board.line(axis, k)
+            empty = full & ~known
+            rest = empty & (empty - 1)
+            # two empty places: clearing the lowest leaves a single bit
+            if not rest or rest & (rest - 1):
+                continue
+            # a complete line holds length // 2 ones, otherwise solve_half_full
+            # already filled both places
+            if popcount(ones) != length // 2 - 1:
+                continue
+            first = self.board.completed_count(axis, ones | rest)
+            second = self.board.completed_count(axis, ones | (empty ^ rest))
+            if first and second:
+                self.contradiction = True
+            elif first:
+                self._put_line(axis, k, empty, empty ^ rest, "solve_distinct",
+                               self._equal_lines(axis, k, ones | rest))
+            elif second:
+                self._put_line(axis, k, empty, rest, "solve_distinct",
+                               self._equal_lines(axis, k, ones | (empty ^ rest)))
 
-        # solve transposed matrix by applying same row rule
-        self.board.transpose()
+    def _equal_lines(self, axis, k, ones):
+        # antecedents of solve_distinct: line k and the completed lines it must
+        # not become
+        full = (1 << self.board.line_length(axis)) - 1
+        return ((axis, k, self.board.known[axis][k]),) + tuple(
+            (axis, other, full) for other in range(self.board.line_count(axis))
+            if self.board.line(axis, other) == (full, ones))
 
-        self.solve_adjacent()
-        self.solve_empty_middle()
-        self.solve_one_remaining()
-        self.solve_half_full()
+    def _solve_distinct_line(self, axis, k):
+        # the index of completed lines is state of the whole board, so this rule
+        # stays out of the line cache
+        if self.stats is None:
+            self.solve_distinct(axis, k)
+            return
+        known = self.board.known[axis][k]
+        start = self.stats.clock()
+        self.solve_distinct(axis, k)
+        elapsed = self.stats.clock() - start
+        self.stats.record("solve_distinct", popcount(self.board.known[axis][k] & ~known),
+                          elapsed)
 
-        # transpose result
-        self.board.transpose()
+    def _solve_open_lines(self, axis):
+        # run solve_distinct on the lines of the axis with two empty cells
+        full = (1 << self.board.line_length(axis)) - 1
+        for k in range(self.board.line_count(axis)):
+            empty = full & ~self.board.known[axis][k]
+            rest = empty & (empty - 1)
+            if rest and not rest & (rest - 1):
+                self._solve_distinct_line(axis, k)
+        return not self.contradiction
 
-        # recurse ...
-        if first_call and not self.is_board_updated:
-            print("No progress made with heuristics!!!\n")
+    def resume(self, cells):
+        """
+        Method runs the rules again after cells were changed or cleared without
+        callbacks, starting from their rows and columns only
+
+        :return False if a contradiction was found
+        """
+        self.contradiction = False
+        for i, j in cells:
+            self.enqueue(ROWS, i)
+            self.enqueue(COLS, j)
+        return self.propagate()
+
+    def solve_line(self, axis, k):
+        """
+        Method applies every rule to line k of the given axis
+        """
+        if self.cache is not None:
+            self._solve_line_cached(axis, k)
+        elif self.stats is not None:
+            self._solve_line_measured(axis, k)
+        else:
+            self._apply_rules(axis, k)
+
+    def _apply_rules(self, axis, k):
+        self.solve_adjacent(axis, k)
+        self.solve_empty_middle(axis, k)
+        self.solve_one_remaining(axis, k)
+        self.solve_half_full(axis, k)
+
+    def _solve_line_cached(self, axis, k):
+        # the rules only read and fill line k, so what they leave on the line
+        # depends on nothing but its masks and can be replayed
+        known, ones = self.board.line(axis, k)
+        key = ("rules", self.board.line_length(axis), known, ones)
+        start = self.stats.clock() if self.stats is not None else 0
+        try:
+            line_known, line_ones = self.cache[key]
+        except KeyError:
+            if self.stats is not None:
+                self._solve_line_measured(axis, k)
+            else:
+                self._apply_rules(axis, k)
+            self.cache[key] = self.board.line(axis, k)
+            return
+        self._put_line(axis, k, line_known & ~known, line_ones, "line_cache")
+        if self.stats is not None:
+            self.stats.record("line_cache", popcount(line_known & ~known),
+                              self.stats.clock() - start)
+
+    def _solve_line_measured(self, axis, k):
+        # a rule only fills cells of its own line, so the growth of the line's
+        # known mask is the number of cells it deduced
+        clock = self.stats.clock
+        for rule in (self.solve_adjacent, self.solve_empty_middle,
+                     self.solve_one_remaining, self.solve_half_full):
+            known = self.board.known[axis][k]
+            start = clock()
+            rule(axis, k)
+            elapsed = clock() - start
+            self.stats.record(rule.__name__,
+                              popcount(self.board.known[axis][k] & ~known), elapsed)
+
+    def is_line_valid(self, axis, k):
+        """
+        Method
+        :return False if line k has three equal neighbours or too many of a symbol,
+                or equals another line while distinct lines are enforced
+        """
+        if self.contradiction:
+            return False
+        if self.distinct_lines and self.board.is_duplicate(axis, k):
+            return False
+        length = self.board.line_length(axis)
+        known, ones = self.board.line(axis, k)
+        zeros = known & ~ones
+        if ones & (ones >> 1) & (ones >> 2) or zeros & (zeros >> 1) & (zeros >> 2):
+            return False
+        return popcount(ones) <= length // 2 and popcount(zeros) <= length - length // 2
+
+    def clear_worklist(self):
+        self.worklist.clear()
+        self.queued.clear()
+        self.completed_axes.clear()
+        self.contradiction = False
+
+    def propagate(self):
+        """
+        Method runs the rules on queued lines until no line is left, cells put by
+        the rules queue their row and column again through update_callback
+
+        :return False if a contradiction was found, the worklist is then dropped
+        """
+        while self.worklist or self.completed_axes:
+            if self.worklist:
+                axis, k = self.worklist.popleft()
+                self.queued.discard((axis, k))
+                self.solve_line(axis, k)
+                if self.distinct_lines:
+                    self._solve_distinct_line(axis, k)
+                valid = self.is_line_valid(axis, k)
+            else:
+                # the four rules learn nothing from a line completed elsewhere,
+                # only solve_distinct does, cells it puts queue their lines
+                valid = self._solve_open_lines(self.completed_axes.pop())
+            if not valid:
+                self.contradiction = True
+                self.worklist.clear()
+                self.queued.clear()
+                self.completed_axes.clear()
+                return False
+        return True
+
+    # Returns False if no complete solution was found
+    def solve(self):
+        self.is_board_updated = False
+        self.contradiction = False
+
+        # every line is dirty at the start, afterwards only changed ones
+        self.enqueue_all()
+        self.propagate()
+
+        if self.contradiction:
+            print("Board is not satisfiable!!!\n")
             return False
         elif not self.is_board_updated:
-            print("Finding a solutions with heuristics stopped!!!\n")
+            print("No progress made with heuristics!!!\n")
             return False
         elif self.board.is_board_solved():
             print("Solution found!!!")
             return True
         else:
-            return self._solve()
-
-    def solve(self):
-        return self._solve(first_call=True)
+            print("Finding a solutions with heuristics stopped!!!\n")
+            return False
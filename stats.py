@@ -0,0 +1,95 @@
+import json
+import time
+
+
+class RuleStats:
+    '''Counters of one rule (or solving step)'''
+
+    def __init__(self):
+        self.invocations = 0
+        self.cells = 0
+        self.time = 0.0
+        self.smt_calls = 0
+        self.models = 0
+        self.formula_size = 0
+
+    def to_dict(self):
+        return {
+            "invocations": self.invocations,
+            "cells": self.cells,
+            "time": self.time,
+            "smt_calls": self.smt_calls,
+            "models": self.models,
+            "formula_size": self.formula_size,
+        }
+
+
+class SolverStats:
+    '''Opt-in statistics shared by the solvers: pass an instance as stats= to
+    collect, per rule, invocations, cells deduced, wall time and SMT work'''
+
+    # the clock used for the wall times
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.rules = {}
+        self.counters = {}
+
+    def rule(self, name):
+        """
+        Method
+        :return the RuleStats of name, created on first use
+        """
+        stats = self.rules.get(name)
+        if stats is None:
+            stats = RuleStats()
+            self.rules[name] = stats
+        return stats
+
+    def record(self, name, cells, elapsed, smt_calls=0, models=0, formula_size=0):
+        """
+        Method records one invocation of rule name
+        """
+        stats = self.rule(name)
+        stats.invocations += 1
+        stats.cells += cells
+        stats.time += elapsed
+        stats.smt_calls += smt_calls
+        stats.models += models
+        stats.formula_size += formula_size
+
+    def count(self, name, value=1):
+        """
+        Method adds value to the free-form counter name
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        """
+        Method adds the statistics of other into these
+        """
+        for name, stats in other.rules.items():
+            self.record(name, stats.cells, stats.time, stats.smt_calls,
+                        stats.models, stats.formula_size)
+            self.rules[name].invocations += stats.invocations - 1
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def to_dict(self):
+        return {
+            "rules": {name: stats.to_dict() for name, stats in self.rules.items()},
+            "counters": dict(self.counters),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def pretty_print(self):
+        print("{:22} {:>10} {:>8} {:>10} {:>9} {:>8}".format(
+            "rule", "calls", "cells", "time ms", "smt", "models"))
+        for name, stats in sorted(self.rules.items(), key=lambda item: -item[1].time):
+            print("{:22} {:10} {:8} {:10.2f} {:9} {:8}".format(
+                name, stats.invocations, stats.cells, 1000 * stats.time,
+                stats.smt_calls, stats.models))
+        for name, value in sorted(self.counters.items()):
+            print("{:22} {:10}".format(name, value))
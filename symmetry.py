@@ -0,0 +1,92 @@
+# Symmetries of binary puzzles and a canonical form of the givens under them
+#
+# The rules do not change when the board is mirrored, rotated or transposed, nor
+# when every '0' becomes a '1' and the other way around. A transform is written
+# as (transpose, flip_rows, flip_cols, swap), applied in that order: transpose the
+# board, reverse the order of the rows, reverse every row, swap the symbols. A
+# square board has 8 geometric transforms and 16 with the swap; a rectangular
+# board keeps its shape under 4 of them, 8 with the swap.
+from bitboard import BitBoard, ROWS, COLS
+
+IDENTITY = (False, False, False, False)
+
+
+def transforms(rows, cols):
+    """
+    Method
+    :return the transforms of a rows x cols board that keep its shape
+    """
+    transposes = (False, True) if rows == cols else (False,)
+    return [(transpose, flip_rows, flip_cols, swap)
+            for transpose in transposes for flip_rows in (False, True)
+            for flip_cols in (False, True) for swap in (False, True)]
+
+
+def inverse(transform):
+    """
+    Method
+    :return the transform that undoes transform
+    """
+    transpose, flip_rows, flip_cols, swap = transform
+    if transpose:
+        # reversing the rows after transposing reverses the columns before it
+        return (transpose, flip_cols, flip_rows, swap)
+    return transform
+
+
+def _reverse_bits(mask, width):
+    return int(format(mask, "0{}b".format(width))[::-1], 2) if mask else 0
+
+
+def transform_masks(board, transform):
+    """
+    Method
+    :return (rows, cols, known, ones) of the transformed board, the masks as read
+            by BitBoard.from_masks
+    """
+    transpose, flip_rows, flip_cols, swap = transform
+    # the columns of a board are the rows of its transpose
+    axis = COLS if transpose else ROWS
+    rows, cols = (board.cols, board.rows) if transpose else (board.rows, board.cols)
+    known_rows = board.known[axis]
+    ones_rows = board.ones[axis]
+    if flip_rows:
+        known_rows = known_rows[::-1]
+        ones_rows = ones_rows[::-1]
+    known = 0
+    ones = 0
+    for i in range(rows - 1, -1, -1):
+        row_known = known_rows[i]
+        row_ones = ones_rows[i]
+        if flip_cols:
+            row_known = _reverse_bits(row_known, cols)
+            row_ones = _reverse_bits(row_ones, cols)
+        if swap:
+            row_ones = row_known & ~row_ones
+        known = (known << cols) | row_known
+        ones = (ones << cols) | row_ones
+    return rows, cols, known, ones
+
+
+def transform_board(board, transform):
+    """
+    Method
+    :return a new board holding board under transform
+    """
+    return BitBoard.from_masks(*transform_masks(board, transform))
+
+
+def canonical_form(board):
+    """
+    Method finds the smallest of the transformed boards, the same for a board and
+    all of its transforms
+
+    :return (key, transform): the (rows, cols, known, ones) masks of the canonical
+            board and the transform that takes board to it
+    """
+    best = None
+    for transform in transforms(board.rows, board.cols):
+        masks = transform_masks(board, transform)
+        if best is None or masks < best[0]:
+            best = (masks, transform)
+    return best
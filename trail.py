@@ -0,0 +1,181 @@
+# History of the filled cells of a board, for undo and redo in the GUI
+#
+# Every put is recorded with the rule that made it and the cells it followed from
+# (BitBoard.cause). Changing or clearing a cell retracts it together with every
+# deduction that depends on it, directly or through other deductions, and leaves
+# the rest of the board as it is, so the solver can resume from there instead of
+# starting over. Edits and solving steps are grouped into actions that undo and
+# redo replay from the same records.
+from bitboard import ROWS, COLS, EMPTY
+
+
+class TrailEntry:
+    '''One filled cell: when it was filled, its symbol, the rule that filled it
+    and the (axis, k, mask) lines it followed from'''
+
+    def __init__(self, seq, i, j, symbol, rule, antecedents):
+        self.seq = seq
+        self.i = i
+        self.j = j
+        self.symbol = symbol
+        self.rule = rule
+        self.antecedents = antecedents
+
+
+class Action:
+    '''The entries one edit or solving step added and retracted'''
+
+    def __init__(self, label):
+        self.label = label
+        self.added = []
+        self.retracted = []
+
+
+class Trail:
+    '''Records the puts of a board with their causes, see the comment at the top
+    of the module'''
+
+    def __init__(self, board):
+        self.board = board
+        # entries of the filled cells, in the order they were filled
+        self.entries = []
+        self.cells = {}
+        self.seq = 0
+        # actions that undo and redo walk
+        self.actions = []
+        self.undone = []
+        # entry being put back by undo or redo, recorded as it is
+        self._replaying = None
+
+    def update_callback(self, symbol, i, j):
+        if symbol == EMPTY:
+            return
+        if self._replaying is not None:
+            entry = self._replaying
+        else:
+            rule, antecedents = self.board.cause or ("given", ())
+            entry = TrailEntry(self.seq, i, j, symbol, rule, antecedents)
+            self.seq += 1
+            if self.actions:
+                self.actions[-1].added.append(entry)
+        self.entries.append(entry)
+        self.cells[(i, j)] = entry
+
+    def begin(self, label):
+        """
+        Method starts a new action, the puts that follow belong to it until the next
+        one begins; the actions undone so far can no longer be redone
+        """
+        self.actions.append(Action(label))
+        self.undone = []
+
+    def rule(self, i, j):
+        """
+        Method
+        :return the rule that filled cell (i, j), or None if the cell is empty
+        """
+        entry = self.cells.get((i, j))
+        return None if entry is None else entry.rule
+
+    def _clear(self, entries):
+        # empty the cells of entries, latest first, without any callbacks
+        for entry in sorted(entries, key=lambda entry: entry.seq, reverse=True):
+            self.cells.pop((entry.i, entry.j), None)
+            self.board.put(EMPTY, entry.i, entry.j)
+        removed = set(id(entry) for entry in entries)
+        self.entries = [entry for entry in self.entries if id(entry) not in removed]
+
+    def _replay(self, entries):
+        # fill the cells of entries again, as recorded
+        for entry in sorted(entries, key=lambda entry: entry.seq):
+            self._replaying = entry
+            self.board.cause = (entry.rule, entry.antecedents)
+            try:
+                self.board.put(entry.symbol, entry.i, entry.j)
+            finally:
+                self._replaying = None
+        self.board.cause = None
+        self.entries.sort(key=lambda entry: entry.seq)
+
+    def dependents(self, i, j):
+        """
+        Method
+        :return the entries that depend on cell (i, j), the entry of the cell
+                first, in the order they were filled
+        """
+        entry = self.cells.get((i, j))
+        if entry is None:
+            if self.board.get(i, j) == EMPTY:
+                return []
+            # filled before the trail was attached, it counts as a given
+            entry = TrailEntry(-1, i, j, self.board.get(i, j), "given", ())
+        # cells removed so far, as masks per line
+        removed = [[0] * self.board.rows, [0] * self.board.cols]
+        removed[ROWS][i] |= 1 << j
+        removed[COLS][j] |= 1 << i
+        found = [entry]
+        # only a later entry can depend on the cell
+        for other in self.entries:
+            if other.seq <= entry.seq or other is entry:
+                continue
+            if any(removed[axis][k] & mask for axis, k, mask in other.antecedents):
+                found.append(other)
+                removed[ROWS][other.i] |= 1 << other.j
+                removed[COLS][other.j] |= 1 << other.i
+        return found
+
+    def retract(self, i, j):
+        """
+        Method clears cell (i, j) and every deduction that depends on it
+
+        :return the retracted entries
+        """
+        entries = self.dependents(i, j)
+        self._clear(entries)
+        if self.actions:
+            self.actions[-1].retracted.extend(entries)
+        return entries
+
+    def edit(self, symbol, i, j):
+        """
+        Method sets cell (i, j) to symbol (EMPTY clears it) as a new action,
+        retracting the old value of the cell and what depends on it
+
+        :return the retracted entries, None if the cell holds symbol already
+        """
+        if self.board.get(i, j) == symbol:
+            return None
+        self.begin("edit")
+        retracted = self.retract(i, j)
+        if symbol != EMPTY:
+            self.board.cause = None
+            self.board.put(symbol, i, j)
+        return retracted
+
+    def undo(self):
+        """
+        Method reverts the last action
+
+        :return the reverted action, None if there is nothing to undo
+        """
+        if not self.actions:
+            return None
+        action = self.actions.pop()
+        self._clear(action.added)
+        self._replay(action.retracted)
+        self.undone.append(action)
+        return action
+
+    def redo(self):
+        """
+        Method makes the last undone action again
+
+        :return the action, None if there is nothing to redo
+        """
+        if not self.undone:
+            return None
+        action = self.undone.pop()
+        self._clear(action.retracted)
+        self._replay(action.added)
+        self.actions.append(action)
+        return action
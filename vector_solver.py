@@ -0,0 +1,177 @@
+# The heuristic rules of Solver applied to many boards at once with NumPy
+#
+# N boards of the same size are stored as an int8 array of shape (N, rows, cols)
+# holding 0, 1 or UNKNOWN. Every rule is evaluated on all lines of all boards at
+# once with shifted comparisons and counts along the line, on the rows and, through
+# a transposed view, on the columns. NumPy is only needed by this module.
+import numpy as np
+
+from bitboard import BitBoard, ROWS
+
+# value of an empty cell in the arrays
+UNKNOWN = -1
+
+
+def boards_to_array(boards):
+    """
+    Method
+    :return int8 array of shape (N, rows, cols) holding the boards, all of one size
+    """
+    boards = list(boards)
+    if not boards:
+        return np.zeros((0, 0, 0), dtype=np.int8)
+    rows, cols = boards[0].rows, boards[0].cols
+    known = np.array([board.known[ROWS] for board in boards], dtype=np.int64)
+    ones = np.array([board.ones[ROWS] for board in boards], dtype=np.int64)
+    if known.shape[1:] != (rows,):
+        raise ValueError("All boards of a batch must have the same size")
+    bits = np.arange(cols, dtype=np.int64)
+    known = (known[..., None] >> bits) & 1
+    ones = (ones[..., None] >> bits) & 1
+    return np.where(known == 1, ones, UNKNOWN).astype(np.int8)
+
+
+def array_to_masks(array):
+    """
+    Method
+    :return (known, ones) whole-board masks of one board, as read by BitBoard.from_masks
+    """
+    rows, cols = array.shape
+    weights = np.int64(1) << np.arange(cols, dtype=np.int64)
+    row_known = ((array != UNKNOWN) * weights).sum(axis=1)
+    row_ones = ((array == 1) * weights).sum(axis=1)
+    known = 0
+    ones = 0
+    for i in range(rows - 1, -1, -1):
+        known = (known << cols) | int(row_known[i])
+        ones = (ones << cols) | int(row_ones[i])
+    return known, ones
+
+
+def array_to_board(array):
+    """
+    Method
+    :return the BitBoard of one board of the array
+    """
+    rows, cols = array.shape
+    return BitBoard.from_masks(rows, cols, *array_to_masks(array))
+
+
+def _deduce(lines):
+    # the cells every rule would set to '0' and to '1', computed for all lines of
+    # all boards from the same state, lines has the shape (N, lines, length)
+    length = lines.shape[2]
+    known = lines != UNKNOWN
+    want0 = np.zeros(lines.shape, dtype=bool)
+    want1 = np.zeros(lines.shape, dtype=bool)
+
+    # '_ 1 1 _' and '_ 0 0 _': the pair at j, j + 1 sets j - 1 and j + 2
+    pair = known[..., :-1] & (lines[..., :-1] == lines[..., 1:])
+    pair_ones = pair & (lines[..., :-1] == 1)
+    pair_zeros = pair & (lines[..., :-1] == 0)
+    want0[..., :-2] |= pair_ones[..., 1:]
+    want0[..., 2:] |= pair_ones[..., :-1]
+    want1[..., :-2] |= pair_zeros[..., 1:]
+    want1[..., 2:] |= pair_zeros[..., :-1]
+
+    # '1 _ 1' and '0 _ 0': the gap at j + 1 gets the other symbol
+    gap = known[..., :-2] & (lines[..., :-2] == lines[..., 2:])
+    want0[..., 1:-1] |= gap & (lines[..., :-2] == 1)
+    want1[..., 1:-1] |= gap & (lines[..., :-2] == 0)
+
+    number_of_ones = (lines == 1).sum(axis=2)
+    number_of_zeros = (lines == 0).sum(axis=2)
+    empty = ~known
+    number_of_empty = length - number_of_ones - number_of_zeros
+
+    # one place left: it takes the symbol that is short
+    last = (number_of_empty == 1)[..., None] & empty
+    short_of_ones = (length - 1 - number_of_ones > number_of_ones)[..., None]
+    want1 |= last & short_of_ones
+    want0 |= last & ~short_of_ones
+
+    # all instances of a symbol placed: the rest is the other symbol
+    zeros_full = (number_of_zeros == length / 2)[..., None]
+    ones_full = (number_of_ones == length / 2)[..., None] & ~zeros_full
+    want1 |= empty & zeros_full
+    want0 |= empty & ones_full
+    return want0, want1
+
+
+def _valid(boards):
+    # False for the boards with three equal neighbours, too many of a symbol or two
+    # equal completed lines
+    valid = np.ones(len(boards), dtype=bool)
+    for lines in (boards, boards.transpose(0, 2, 1)):
+        length = lines.shape[2]
+        triple = ((lines[..., :-2] != UNKNOWN) & (lines[..., :-2] == lines[..., 1:-1])
+                  & (lines[..., 1:-1] == lines[..., 2:]))
+        valid &= ~triple.any(axis=(1, 2))
+        valid &= ((lines == 1).sum(axis=2) <= length // 2).all(axis=1)
+        valid &= ((lines == 0).sum(axis=2) <= length - length // 2).all(axis=1)
+        # a completed line as the mask of its ones, an open one as a negative number
+        # of its own so that it equals no other line
+        weights = np.int64(1) << np.arange(length, dtype=np.int64)
+        codes = ((lines == 1) * weights).sum(axis=2)
+        complete = (lines != UNKNOWN).all(axis=2)
+        codes = np.where(complete, codes, -1 - np.arange(lines.shape[1]))
+        codes.sort(axis=1)
+        valid &= ~(codes[:, 1:] == codes[:, :-1]).any(axis=1)
+    return valid
+
+
+class VectorSolver:
+    '''Runs the four heuristic rules on a batch of boards of the same size until no
+    board changes any more'''
+
+    def __init__(self, boards):
+        # array of shape (N, rows, cols), see boards_to_array
+        self.boards = np.array(boards, dtype=np.int8)
+        self.contradiction = np.zeros(len(self.boards), dtype=bool)
+        # number of passes over rows and columns made by propagate
+        self.rounds = 0
+
+    def propagate(self):
+        """
+        Method applies the rules on the rows and then on the columns of all boards,
+        again and again on the boards that changed, until none changes
+        """
+        active = np.flatnonzero(~self.contradiction)
+        while active.size:
+            self.rounds += 1
+            boards = self.boards[active]
+            changed = np.zeros(len(active), dtype=bool)
+            conflict = np.zeros(len(active), dtype=bool)
+            for lines in (boards, boards.transpose(0, 2, 1)):
+                want0, want1 = _deduce(lines)
+                empty = lines == UNKNOWN
+                # a cell wanted as both symbols means the board has no solution
+                conflict |= (want0 & want1 & empty).any(axis=(1, 2))
+                fill1 = want1 & empty
+                fill0 = want0 & empty & ~want1
+                lines[fill1] = 1
+                lines[fill0] = 0
+                changed |= (fill0 | fill1).any(axis=(1, 2))
+            conflict |= ~_valid(boards)
+            self.boards[active] = boards
+            self.contradiction[active[conflict]] = True
+            active = active[changed & ~conflict]
+
+    def solved(self):
+        """
+        Method
+        :return bool array, True for the boards that are completely filled and valid
+        """
+        return (self.boards != UNKNOWN).all(axis=(1, 2)) & ~self.contradiction
+
+    def solve(self):
+        """
+        Method propagates and reports like Solver.solve, for the whole batch
+
+        :return bool array, True for the boards solved by the rules alone
+        """
+        self.propagate()
+        solved = self.solved()
+        print("Solved {} of {} boards with heuristics, {} not satisfiable".format(
+            int(solved.sum()), len(self.boards), int(self.contradiction.sum())))
+        return solved
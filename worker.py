@@ -0,0 +1,63 @@
+# Background solving for the GUI
+#
+# The solvers run on a worker thread while the event loop keeps drawing. Every
+# cell the worker puts on the board is streamed back through a queue, and the
+# event loop copies it into the view on its next frame.
+import queue
+import threading
+
+
+class SolveWorker:
+    '''Runs one solving step at a time on a background thread and streams the
+    cells it deduces to the event loop'''
+
+    def __init__(self, board):
+        self.board = board
+        self.updates = queue.Queue()
+        self.thread = None
+
+    def update_callback(self, symbol, i, j):
+        # only the puts of the worker are streamed, the view already knows the rest
+        if threading.current_thread() is self.thread:
+            self.updates.put((symbol, i, j))
+
+    def is_busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, step, done):
+        """
+        Method runs step() on a new worker thread, done(result) is called from poll
+        once step has returned
+
+        :return False if the worker is still busy with an earlier step
+        """
+        if self.is_busy():
+            return False
+        self.thread = threading.Thread(target=self._run, args=(step, done), daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, step, done):
+        try:
+            result = step()
+        except Exception as error:
+            print("Solving stopped with an error: {}".format(error))
+            result = None
+        # queued after every cell of the step, so the view is complete when done runs
+        self.updates.put((done, result))
+
+    def poll(self):
+        """
+        Method shows the cells streamed since the last call on the board and calls
+        the done callbacks of the steps that finished, from the event loop thread
+        """
+        while True:
+            try:
+                update = self.updates.get_nowait()
+            except queue.Empty:
+                return
+            if len(update) == 2:
+                done, result = update
+                done(result)
+            else:
+                self.board.update_cell(*update)